@@ -0,0 +1,163 @@
+# batch_evaluate.py
+# 批量评测：从 JSONL 读取问题，并发执行 RAGPipeline.aanswer 和 ResponseEvaluator，
+# LLM 结果按 prompt 哈希缓存在磁盘上，重跑时只为变化的部分调用模型。
+#
+#   python batch_evaluate.py questions.jsonl --concurrency 8
+#   python batch_evaluate.py questions.jsonl --stub      # 用替身 LLM 离线运行
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+from langchain_core.globals import set_llm_cache
+
+from llm_cache import PromptHashCache
+from rate_limit import backoff_delay
+
+
+def load_questions(path):
+    """每行一个 JSON：{"query": ...}，可选 "id" 以及任意附加字段（原样写入结果）。"""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if line.strip():
+                item = json.loads(line)
+                item.setdefault("id", i)
+                questions.append(item)
+    return questions
+
+
+async def with_retry(fn, retries=3, base=1.0, cap=30.0):
+    """调用异步函数 fn，失败后按抖动指数退避重试，超过 retries 次抛出最后一次的异常。"""
+    for attempt in range(retries + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt, base=base, cap=cap)
+            print(f"⚠️ 第 {attempt + 1} 次调用失败（{e}），{delay:.1f}s 后重试")
+            await asyncio.sleep(delay)
+
+
+async def evaluate_one(item, pipeline, evaluator, semaphore, retries):
+    async with semaphore:
+        record = dict(item)
+        timings = {}
+        start = time.perf_counter()
+        try:
+            response = await with_retry(lambda: pipeline.aanswer(item["query"], timings=timings), retries)
+            judge_start = time.perf_counter()
+            evaluation = await with_retry(
+                lambda: evaluator.aevaluate(item["query"], response, response["sources"]), retries
+            )
+            timings["judge"] = time.perf_counter() - judge_start
+            record.update({
+                "answer": response["answer"],
+                "sources": [src["url"] for src in response["sources"]],
+                "scores": evaluation["parsed_scores"],
+                "raw_evaluation": evaluation["raw_evaluation"],
+            })
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        timings["total"] = time.perf_counter() - start
+        record["timings"] = timings
+        return record
+
+
+def summarize(records) -> dict:
+    ok = [r for r in records if "error" not in r]
+    metrics = sorted({m for r in ok for m in r["scores"]})
+    scores = {}
+    for metric in metrics:
+        values = np.array([r["scores"][metric] for r in ok if metric in r["scores"]])
+        scores[metric] = {"mean": float(values.mean()), "min": float(values.min()), "n": len(values)}
+
+    latency = {}
+    for stage in ("retrieve", "generate", "judge", "total"):
+        values = np.array([r["timings"][stage] for r in records if stage in r["timings"]]) * 1000
+        if len(values):
+            latency[stage] = {
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "mean_ms": float(values.mean()),
+            }
+    return {
+        "queries": len(records),
+        "failed": len(records) - len(ok),
+        # 没有解析出任何分数的评测，通常说明评测输出格式变了
+        "unparsed": sum(1 for r in ok if not r["scores"]),
+        "scores": scores,
+        "latency": latency,
+    }
+
+
+async def run_batch(questions, pipeline, evaluator, concurrency=4, retries=3):
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [evaluate_one(item, pipeline, evaluator, semaphore, retries) for item in questions]
+    records = []
+    for i, task in enumerate(asyncio.as_completed(tasks), 1):
+        records.append(await task)
+        print(f"📝 已完成 {i}/{len(tasks)}")
+    # 按输入顺序输出
+    order = {item["id"]: i for i, item in enumerate(questions)}
+    records.sort(key=lambda r: order[r["id"]])
+    return records
+
+
+def build(stub=False, collection_name="xiaohongshu_content", db_path="./milvus_demo.db"):
+    from evaluate_response import ResponseEvaluator
+    from rag_pipeline import RAGPipeline
+
+    llm = None
+    if stub:
+        from bench_fixtures import FakeChatVertexAI
+
+        llm = FakeChatVertexAI(latency=0.05, token_latency=0.0)
+    # 评测时关闭语义答案缓存，每个问题都走完整的检索 + 生成
+    pipeline = RAGPipeline(collection_name=collection_name, db_path=db_path, llm=llm,
+                           answer_cache_threshold=None)
+    evaluator = ResponseEvaluator(llm=llm)
+    return pipeline, evaluator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch evaluation of RAG answers")
+    parser.add_argument("questions", help="JSONL file, one {\"query\": ...} per line")
+    parser.add_argument("--output", default="./eval_results", help="directory for results")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--cache", default="./llm_cache.db", help="prompt-hash LLM cache; empty to disable")
+    parser.add_argument("--stub", action="store_true", help="use an offline stub LLM instead of Gemini")
+    parser.add_argument("--db-path", default="./milvus_demo.db")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache:
+        cache = PromptHashCache(args.cache)
+        set_llm_cache(cache)
+
+    questions = load_questions(args.questions)
+    pipeline, evaluator = build(stub=args.stub, db_path=args.db_path)
+
+    start = time.perf_counter()
+    records = asyncio.run(run_batch(questions, pipeline, evaluator, args.concurrency, args.retries))
+    summary = summarize(records)
+    summary["wall_seconds"] = time.perf_counter() - start
+    if cache is not None:
+        summary["llm_cache"] = cache.stats()
+
+    os.makedirs(args.output, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    with open(os.path.join(args.output, f"eval_{stamp}.jsonl"), "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    with open(os.path.join(args.output, f"eval_{stamp}_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
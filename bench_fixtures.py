@@ -0,0 +1,258 @@
+# bench_fixtures.py
+# 离线基准测试和测试用的替身：合成收藏夹、静态收藏夹页面、本地图片服务器和带可配置延迟的假 ChatVertexAI
+import functools
+import os
+import random
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, List, Optional
+
+import pandas as pd
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+TOPICS = [
+    ("杭州", "hangzhou", ["西湖", "龙井茶", "灵隐寺", "断桥", "醋鱼"]),
+    ("上海", "shanghai", ["外滩", "咖啡店", "生煎", "武康路", "展览"]),
+    ("做饭", "recipe", ["蛋炒饭", "隔夜米饭", "酱油", "火候", "葱花"]),
+    ("学习", "study", ["考研", "单词", "作文模板", "错题本", "番茄钟"]),
+    ("编程", "python", ["asyncio", "装饰器", "pandas", "单元测试", "类型注解"]),
+    ("健身", "fitness", ["深蹲", "蛋白质", "有氧", "拉伸", "体脂"]),
+]
+
+ENGLISH_FILLER = [
+    "Saving this for later.", "Highly recommend!", "Step by step guide below.",
+    "Budget friendly and easy to follow.", "Tips I wish I knew earlier.",
+]
+
+
+def generate_board(n_notes: int, image_base_url: Optional[str] = None, image_names: List[str] = (),
+                   image_ratio: float = 0.2, seed: int = 0) -> pd.DataFrame:
+    """
+    生成 n_notes 条中英混合的合成笔记，列与 crawl_xiaohongshu_board 的输出一致
+    （title / content / url / images）。image_ratio 比例的笔记带一张 fixture 图片。
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_notes):
+        city, keyword, terms = rng.choice(TOPICS)
+        picked = rng.sample(terms, 3)
+        title = f"{city}{picked[0]}攻略 #{i} {keyword}"
+        sentences = [f"{term}真的很推荐，{rng.choice(ENGLISH_FILLER)}" for term in picked]
+        sentences += [f"{keyword} tip {k}: {rng.choice(terms)} 第{k}步。" for k in range(rng.randint(2, 12))]
+        images = []
+        if image_base_url and image_names and rng.random() < image_ratio:
+            images = [f"{image_base_url}/{rng.choice(image_names)}"]
+        rows.append({
+            "title": title,
+            "content": "".join(sentences),
+            "url": f"https://www.xiaohongshu.com/explore/bench{i:08d}",
+            "images": str(images),
+        })
+    return pd.DataFrame(rows)
+
+
+def make_fixture_images(directory: str, n_images: int = 8, size=(800, 600)) -> List[str]:
+    """
+    生成带文字的 PNG 图片（OCR 有内容可识别），返回文件名列表。
+    字号和行距要让 text_score 高于 PreprocessConfig.min_text_score，否则前处理会把它们当作无文字图片跳过，
+    基准测试里的 OCR 吞吐就成了下载和跳过的速度。
+    """
+    from PIL import Image, ImageDraw
+
+    os.makedirs(directory, exist_ok=True)
+    font = _font(32)
+    names = []
+    for i in range(n_images):
+        name = f"fixture_{i}.png"
+        img = Image.new("RGB", size, "white")
+        draw = ImageDraw.Draw(img)
+        keyword = TOPICS[i % len(TOPICS)][1]
+        for line in range((size[1] - 60) // 48):
+            draw.text((30, 30 + line * 48), f"Fixture {i} {keyword} note line {line}", fill="black", font=font)
+        img.save(os.path.join(directory, name))
+        names.append(name)
+    return names
+
+
+def _font(size):
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 的默认字体不能调整大小
+        return ImageFont.load_default()
+
+
+# make_ocr_fixture_set 第 i 张文字截图（及其副本）里的关键词，用来检查识别结果是否属于这张图
+OCR_FIXTURE_KEYWORDS = ["hangzhou", "shanghai", "recipe", "fitness"]
+
+
+def ocr_fixture_keyword(name: str) -> str:
+    """text_{i}.jpg / duplicate_{i}.jpg 应该识别出的关键词。"""
+    index = int(os.path.splitext(name)[0].rsplit("_", 1)[1])
+    return OCR_FIXTURE_KEYWORDS[index]
+
+
+def make_ocr_fixture_set(directory: str, seed: int = 0) -> dict:
+    """
+    OCR 前处理的测试图片，按类别返回文件名：
+    text（高分辨率文字截图，每张的关键词不同，排版相同）、duplicate（text 的逐字节副本，模拟不同笔记转发同一张图）、
+    icon（图标 / 表情大小的小图）、photo（没有文字的平滑图片）。
+    """
+    import shutil
+
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    fixtures = {"text": [], "duplicate": [], "icon": [], "photo": []}
+
+    font = _font(72)
+    for i, keyword in enumerate(OCR_FIXTURE_KEYWORDS):
+        img = Image.new("RGB", (2400, 3200), "white")
+        draw = ImageDraw.Draw(img)
+        for line in range(20):
+            draw.text((120, 120 + line * 150), f"Fixture {i} line {line}: {keyword} weekend notes and tips", fill="black", font=font)
+        name = f"text_{i}.jpg"
+        img.save(os.path.join(directory, name), quality=92)
+        fixtures["text"].append(name)
+
+        dup = f"duplicate_{i}.jpg"
+        shutil.copyfile(os.path.join(directory, name), os.path.join(directory, dup))
+        fixtures["duplicate"].append(dup)
+
+    for i in range(6):
+        side = 48 if i % 2 else 64
+        img = Image.new("RGB", (side, side), tuple(int(c) for c in rng.integers(0, 255, 3)))
+        ImageDraw.Draw(img).ellipse((8, 8, side - 8, side - 8), fill="yellow")
+        name = f"icon_{i}.png"
+        img.save(os.path.join(directory, name))
+        fixtures["icon"].append(name)
+
+    for i in range(4):
+        y, x = np.mgrid[0:1200, 0:1600]
+        base = (x / 1600 * 120 + y / 1200 * 80 + i * 20).astype(np.float32)
+        noise = rng.normal(0, 6, base.shape)
+        arr = np.clip(np.stack([base + noise, base * 0.8 + noise, 200 - base * 0.5 + noise], axis=-1), 0, 255)
+        name = f"photo_{i}.jpg"
+        Image.fromarray(arr.astype(np.uint8)).save(os.path.join(directory, name), quality=90)
+        fixtures["photo"].append(name)
+    return fixtures
+
+
+def make_board_site(directory: str, n_notes: int, image_base_url: Optional[str] = None,
+                    image_names: List[str] = (), seed: int = 0) -> List[dict]:
+    """
+    生成模仿小红书结构的静态页面：board.html 是收藏夹页（section.note-item 里的 a.cover.mask.ld 链接），
+    notes/note_{i}.html 是详情页（.title / .note-text / img）。
+    返回每条笔记应抓到的 {title, content, path, images}，path 是相对站点根目录的链接。
+    """
+    from html import escape
+
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory, "notes"), exist_ok=True)
+    notes = []
+    cards = []
+    for i in range(n_notes):
+        city, keyword, terms = TOPICS[i % len(TOPICS)]
+        title = f"{city}{rng.choice(terms)}攻略 #{i}"
+        content = f"{keyword} note {i}: {rng.choice(ENGLISH_FILLER)}"
+        images = []
+        if image_base_url and image_names:
+            images = [f"{image_base_url}/{image_names[i % len(image_names)]}"]
+        path = f"/notes/note_{i}.html"
+        with open(os.path.join(directory, "notes", f"note_{i}.html"), "w", encoding="utf-8") as f:
+            f.write(
+                "<html><body>"
+                f'<div class="title">{escape(title)}</div>'
+                f'<div class="note-text">{escape(content)}</div>'
+                + "".join(f'<img src="{escape(url)}">' for url in images)
+                + "</body></html>"
+            )
+        cards.append(f'<section class="note-item"><a class="cover mask ld" href="{path}">{escape(title)}</a></section>')
+        notes.append({"title": title, "content": content, "path": path, "images": images})
+
+    with open(os.path.join(directory, "board.html"), "w", encoding="utf-8") as f:
+        f.write("<html><body>" + "".join(cards) + "</body></html>")
+    return notes
+
+
+class LocalImageServer:
+    """在后台线程里用 http.server 提供本地图片（或 make_board_site 生成的静态页面），代替小红书图床和网页。"""
+
+    def __init__(self, directory: str, host: str = "127.0.0.1", port: int = 0):
+        handler = functools.partial(_QuietHandler, directory=directory)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="bench-image-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class FakeChatVertexAI(BaseChatModel):
+    """
+    ChatVertexAI 的离线替身：固定延迟后返回模板回答，支持 invoke / ainvoke / stream / astream。
+    查询改写的 prompt 返回 n 行改写结果，评测 prompt 返回固定格式的打分，其余返回一段固定长度的回答。
+    """
+    model_name: str = "fake-gemini"
+    latency: float = 0.5           # 首 token 前的延迟（秒）
+    token_latency: float = 0.01    # 流式输出时每个 token 的间隔（秒）
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-vertexai"
+
+    def _reply(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = messages[-1].content if messages else ""
+        if "rephrasings" in prompt:
+            question = prompt.split("User Question:")[-1].split("Rewritten Queries:")[0].strip()
+            return [f"{k}. {question} variant {k}\n" for k in range(1, 4)]
+        if "evaluate the quality" in prompt:
+            metrics = ["Relevance", "Accuracy", "Completeness", "Fluency", "Usefulness"]
+            # 分数由 prompt 决定，同一输入多次评测结果一致
+            return [f"{k}. {metric}: {3 + (len(prompt) + k) % 3}/5\nFeedback: stub: ok\n\n"
+                    for k, metric in enumerate(metrics, 1)] + ["Overall Assessment: stub evaluation\n"]
+        return [f"token{k} " for k in range(self.answer_tokens)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        parts = self._reply(messages)
+        time.sleep(self.latency + self.token_latency * len(parts))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(parts)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for part in self._reply(messages):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=part))
+            if run_manager:
+                run_manager.on_llm_new_token(part, chunk=chunk)
+            yield chunk
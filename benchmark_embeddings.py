@@ -0,0 +1,124 @@
+# benchmark_embeddings.py
+# 对比 torch / onnx / int8 三种 embedding 后端的延迟、吞吐和与 fp32 参考模型的一致性
+import json
+import os
+import time
+
+import numpy as np
+from board_store import find_board_file, iter_board_batches
+from embedding_backends import EMBEDDING_BACKENDS, load_embedding_model
+from embedding_database import EMBEDDING_MODEL_NAME
+
+SAMPLE_TEXTS = [
+    "杭州西湖一日游攻略，推荐路线和美食",
+    "How do you solve a Rubik's Cube step by step?",
+    "五分钟学会蛋炒饭，米饭要隔夜的才好吃",
+    "Best budget mechanical keyboards for programmers",
+    "上海周末去哪儿：小众咖啡店合集",
+    "Easy Chinese fried rice recipe with leftover rice",
+    "考研英语作文模板和高频词汇整理",
+    "Python asyncio tutorial for beginners",
+]
+
+
+def sample_variants(limit):
+    """
+    由内置样例组合出 limit 条互不相同的文本。语料中不能有完全相同的文本：
+    相同向量之间的近邻顺序是任意的，neighbour_recall 也假设每条文本自己排第一。
+    """
+    n = len(SAMPLE_TEXTS)
+    texts = []
+    for i in range(limit):
+        first = SAMPLE_TEXTS[i % n]
+        second = SAMPLE_TEXTS[(i // n + i % n + 1) % n]
+        texts.append(f"{first} {second} #{i}")
+    return texts
+
+
+def load_texts(board_path=None, limit=512):
+    """优先使用爬下来的收藏夹文本（去重），没有时用内置样例的组合。"""
+    try:
+        board_path = find_board_file("./xiaohongshu_board", board_path)
+    except FileNotFoundError:
+        board_path = None
+    if board_path and os.path.exists(board_path):
+        texts = []
+        for df in iter_board_batches(board_path, batch_size=limit):
+            df = df.fillna("")
+            texts.extend((df["title"].astype(str) + " " + df["content"].astype(str)).tolist())
+            texts = list(dict.fromkeys(texts))
+            if len(texts) >= limit:
+                break
+        if texts:
+            return texts[:limit]
+    return sample_variants(limit)
+
+
+def _normalize(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True).clip(min=1e-12)
+
+
+def neighbour_recall(reference, candidate, k=5):
+    """以参考模型的 top-k 近邻为标准，候选后端的近邻召回率（把每条文本当作查询）。"""
+    ref = _normalize(reference)
+    cand = _normalize(candidate)
+    k = min(k, len(ref) - 1)
+    ref_top = np.argsort(-(ref @ ref.T), axis=1)[:, 1:k + 1]
+    cand_top = np.argsort(-(cand @ cand.T), axis=1)[:, 1:k + 1]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]
+    return float(np.mean(overlap))
+
+
+def benchmark_backend(backend, texts, queries, num_threads=None, max_seq_length=None, batch_size=32):
+    start = time.perf_counter()
+    model = load_embedding_model(EMBEDDING_MODEL_NAME, backend=backend,
+                                 num_threads=num_threads, max_seq_length=max_seq_length)
+    load_seconds = time.perf_counter() - start
+    model.encode(["warm up"], show_progress_bar=False)
+
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        model.encode([q], show_progress_bar=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+    batch_seconds = time.perf_counter() - start
+
+    return embeddings.astype(np.float32), {
+        "load_seconds": load_seconds,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+        "batch_texts_per_second": len(texts) / batch_seconds,
+    }
+
+
+def run_benchmark(backends=EMBEDDING_BACKENDS, num_threads=None, max_seq_length=None, n_queries=50):
+    texts = load_texts()
+    queries = [t[:30] for t in texts[:n_queries]]
+    report = {}
+    reference = None
+    for backend in backends:
+        try:
+            embeddings, stats = benchmark_backend(backend, texts, queries, num_threads, max_seq_length)
+        except Exception as e:
+            print(f"❌ 后端 {backend} 加载失败: {e}")
+            continue
+        if reference is None:
+            reference = embeddings  # 第一个后端（默认 torch fp32）作为参考
+        cos = np.sum(_normalize(reference) * _normalize(embeddings), axis=1)
+        stats["cosine_mean"] = float(cos.mean())
+        stats["cosine_min"] = float(cos.min())
+        stats["neighbour_recall@5"] = neighbour_recall(reference, embeddings)
+        report[backend] = stats
+        print(f"{backend:>6}: 单条 p50 {stats['query_p50_ms']:.1f}ms  批量 {stats['batch_texts_per_second']:.1f} texts/s  "
+              f"cos {stats['cosine_mean']:.4f} (min {stats['cosine_min']:.4f})  "
+              f"近邻召回 {stats['neighbour_recall@5']:.3f}")
+    return report
+
+
+if __name__ == "__main__":
+    report = run_benchmark(num_threads=os.cpu_count(), max_seq_length=128)
+    with open("./benchmark_embeddings.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
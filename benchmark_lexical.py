@@ -0,0 +1,80 @@
+# benchmark_lexical.py
+# 比较 vector / lexical / hybrid 三种检索方式的延迟和召回率
+import json
+import random
+import time
+
+import numpy as np
+
+from embedding_database import MilvusStorage
+from lexical_index import tokenize
+
+
+def sample_keyword_queries(storage, n_queries=50, seed=0):
+    """
+    没有人工标注时，从库里随机取笔记，用该笔记中最罕见的词（地名、商品名一类的精确词）
+    作为查询，该笔记即为正确答案。
+    """
+    rows = storage.client.query(
+        collection_name=storage.collection_name,
+        filter="id >= 0",
+        output_fields=["id", "title", "content", "note_id"]
+    )
+    doc_freq = {}
+    for row in rows:
+        for term in set(tokenize(f"{row['title']} {row['content']}")):
+            doc_freq[term] = doc_freq.get(term, 0) + 1
+
+    rng = random.Random(seed)
+    queries = []
+    for row in rng.sample(rows, min(n_queries, len(rows))):
+        terms = [t for t in set(tokenize(f"{row['title']} {row['content']}")) if len(t) >= 2]
+        if not terms:
+            continue
+        term = min(terms, key=lambda t: (doc_freq[t], t))
+        queries.append({"query": term, "relevant": [row.get("note_id", row["id"])]})
+    return queries
+
+
+def load_queries(path):
+    """JSONL，每行 {"query": ..., "relevant": [note_id, ...]}。"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_benchmark(storage, queries, top_k=5, modes=("vector", "lexical", "hybrid"), repeat=3):
+    report = {}
+    for mode in modes:
+        # 预热一次，排除首次加载的开销
+        storage.search(queries[0]["query"], top_k=top_k, similarity_threshold=None, mode=mode)
+
+        latencies = []
+        hits = 0
+        for item in queries:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                res = storage.search(item["query"], top_k=top_k, similarity_threshold=None, mode=mode)
+                latencies.append(time.perf_counter() - start)
+            found = {match["id"] for match in res[0]}
+            hits += bool(found & set(item["relevant"]))
+
+        latencies = np.array(latencies) * 1000
+        report[mode] = {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            f"recall@{top_k}": hits / len(queries),
+        }
+        print(f"{mode:>8}: p50 {report[mode]['p50_ms']:.2f}ms  p95 {report[mode]['p95_ms']:.2f}ms  "
+              f"recall@{top_k} {report[mode][f'recall@{top_k}']:.3f}")
+    return report
+
+
+if __name__ == "__main__":
+    storage = MilvusStorage(collection_name="xiaohongshu_content", db_path="./milvus_demo.db", lexical_index=True)
+    queries = sample_keyword_queries(storage, n_queries=50)
+    # 也可以使用人工标注的查询集：queries = load_queries("./lexical_queries.jsonl")
+    print(f"共 {len(queries)} 条查询，collection 中 BM25 索引 {len(storage.lexical)} 行")
+    report = run_benchmark(storage, queries, top_k=5)
+    with open("./benchmark_lexical.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    storage.close()
@@ -0,0 +1,67 @@
+# benchmark_ocr_preprocess.py
+# 在固定的测试图片集上对比 OCR 前处理开启 / 关闭时 tesseract 消耗的 CPU 时间
+import json
+import tempfile
+import time
+
+from bench_fixtures import OCR_FIXTURE_KEYWORDS, LocalImageServer, make_ocr_fixture_set, ocr_fixture_keyword
+from ocr_pipeline import ParallelOCR
+from ocr_preprocess import PreprocessConfig
+
+
+def run_ocr(urls, preprocess):
+    start = time.perf_counter()
+    with ParallelOCR(preprocess=preprocess, cache=None) as ocr:
+        texts = ocr.ocr_urls(urls)
+        stats = dict(ocr.stats)
+    stats["wall_seconds"] = time.perf_counter() - start
+    return texts, stats
+
+
+def recognized_correctly(name, text) -> bool:
+    words = text.lower()
+    expected = ocr_fixture_keyword(name)
+    others = [k for k in OCR_FIXTURE_KEYWORDS if k != expected]
+    return expected in words and not any(k in words for k in others)
+
+
+def count_correct(names, texts, text_names) -> int:
+    return sum(1 for name, text in zip(names, texts) if name in text_names and recognized_correctly(name, text))
+
+
+def run_benchmark(config=PreprocessConfig()):
+    with tempfile.TemporaryDirectory() as workdir:
+        fixtures = make_ocr_fixture_set(workdir)
+        with LocalImageServer(workdir) as server:
+            names = [name for group in fixtures.values() for name in group]
+            urls = [f"{server.base_url}/{name}" for name in names]
+
+            baseline_texts, baseline = run_ocr(urls, preprocess=None)
+            texts, optimized = run_ocr(urls, preprocess=config)
+
+    # 有文字的图片（含副本）在前处理后是否仍然识别出了自己的文字：
+    # 必须包含这张图的关键词，且不能包含其他图片的关键词（去重把别的图的结果当成了这张图）
+    text_names = set(fixtures["text"]) | set(fixtures["duplicate"])
+    kept = count_correct(names, texts, text_names)
+    kept_baseline = count_correct(names, baseline_texts, text_names)
+
+    report = {
+        "images": {group: len(items) for group, items in fixtures.items()},
+        "baseline": baseline,
+        "preprocessed": optimized,
+        "ocr_cpu_seconds_saved": baseline["ocr_cpu_seconds"] - optimized["ocr_cpu_seconds"],
+        "text_images_recognized": {"baseline": kept_baseline, "preprocessed": kept, "total": len(text_names)},
+    }
+    print(f"tesseract CPU: {baseline['ocr_cpu_seconds']:.2f}s -> {optimized['ocr_cpu_seconds']:.2f}s，"
+          f"节省 {report['ocr_cpu_seconds_saved']:.2f}s")
+    print(f"墙钟时间: {baseline['wall_seconds']:.2f}s -> {optimized['wall_seconds']:.2f}s")
+    print(f"有文字的图片识别正确: {kept_baseline} -> {kept} / {len(text_names)}")
+    assert optimized["ocr"] > 0, "前处理把所有图片都跳过了，没有测到 OCR"
+    assert kept == kept_baseline, "前处理后识别正确的图片变少了"
+    return report
+
+
+if __name__ == "__main__":
+    report = run_benchmark()
+    with open("./benchmark_ocr_preprocess.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,163 @@
+# benchmark_suite.py
+# 离线性能基准：不需要网络和 Gemini 凭据（embedding 模型需已在本地 HuggingFace 缓存中）。
+# 测量入库各阶段吞吐，以及不同数据量下 search / retriever / RAGPipeline.answer 的延迟分位数，
+# 结果写入 bench_results/ 下的 JSON，便于不同版本之间对比。
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from bench_fixtures import FakeChatVertexAI, LocalImageServer, generate_board, make_fixture_images
+from ocr_pipeline import parse_image_list
+from resources import ResourceRegistry
+
+COLLECTION_NAME = "bench_content"
+
+QUERIES = [
+    "杭州西湖怎么玩", "hangzhou", "蛋炒饭用隔夜米饭吗", "Chinese food recipe",
+    "考研英语作文模板", "python asyncio", "上海咖啡店推荐", "深蹲 蛋白质",
+]
+
+
+def percentiles(samples) -> dict:
+    ms = np.array(samples) * 1000
+    return {
+        "n": len(samples),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def measure_latency(fn, queries, repeat=5) -> dict:
+    fn(queries[0])  # 预热
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_ingest(storage, df) -> dict:
+    """
+    分阶段测量入库吞吐：OCR（下载 + tesseract）、向量化、Milvus 写入，再测一次完整的 insert_data。
+    """
+    notes = df.to_dict("records")
+    image_lists = [parse_image_list(note["images"]) for note in notes]
+    n_images = sum(len(images) for images in image_lists)
+
+    start = time.perf_counter()
+    with storage.new_ocr() as ocr:
+        ocr_texts = ocr.ocr_notes(image_lists)
+        ocr_stats = dict(ocr.stats)
+    ocr_seconds = time.perf_counter() - start
+    # fixture 图片全被前处理跳过时，OCR 吞吐测的只是下载和跳过
+    assert not n_images or ocr_stats["ocr"] > 0, f"没有图片真正经过 OCR: {ocr_stats}"
+
+    for note, images, text in zip(notes, image_lists, ocr_texts):
+        note["images"] = images
+        note["ocr_text"] = text
+    start = time.perf_counter()
+    rows = storage.build_rows_from_notes(notes)
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    storage.upsert_rows(rows)
+    storage.flush()
+    insert_seconds = time.perf_counter() - start
+
+    # 内容未变时的增量同步：只有哈希比对，全部跳过
+    start = time.perf_counter()
+    storage.sync_data(df)
+    resync_seconds = time.perf_counter() - start
+
+    # 端到端的 insert_data（清空后重新入库，OCR、向量化、写入流水线一起跑）
+    storage.delete(filter_str="id >= 0")
+    start = time.perf_counter()
+    storage.insert_data(df)
+    insert_data_seconds = time.perf_counter() - start
+
+    return {
+        "notes": len(notes),
+        "rows": len(rows),
+        "images": n_images,
+        "ocr_images_per_second": n_images / ocr_seconds if n_images else None,
+        "ocr_seconds": ocr_seconds,
+        "ocr_stats": ocr_stats,
+        "embed_rows_per_second": len(rows) / embed_seconds,
+        "embed_seconds": embed_seconds,
+        "insert_rows_per_second": len(rows) / insert_seconds,
+        "insert_seconds": insert_seconds,
+        "resync_unchanged_seconds": resync_seconds,
+        "insert_data_notes_per_second": len(notes) / insert_data_seconds,
+        "insert_data_seconds": insert_data_seconds,
+    }
+
+
+def bench_size(n_notes, workdir, image_server, image_names, llm_latency, repeat, storage_kwargs) -> dict:
+    db_path = os.path.join(workdir, f"bench_{n_notes}.db")
+    df = generate_board(n_notes, image_base_url=image_server.base_url, image_names=image_names)
+
+    llm = FakeChatVertexAI(latency=llm_latency)
+    registry = ResourceRegistry(
+        COLLECTION_NAME, db_path,
+        storage_kwargs={"ocr_cache_path": None, **storage_kwargs},
+        llm=llm, answer_cache_threshold=None, top_k=3,
+    )
+    try:
+        storage = registry.storage()
+        result = {"ingest": bench_ingest(storage, df)}
+
+        pipeline = registry.pipeline()
+        result["search"] = measure_latency(lambda q: storage.search(q, top_k=3), QUERIES, repeat)
+        # 改写结果会被缓存，这里测的是稳定状态下的检索延迟
+        result["retriever"] = measure_latency(pipeline.retriever.invoke, QUERIES, repeat)
+        result["answer"] = measure_latency(pipeline.answer, QUERIES, max(1, repeat // 2))
+        return result
+    finally:
+        registry.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run_suite(sizes=(100, 1000, 5000), llm_latency=0.5, repeat=5, storage_kwargs=None, output_dir="./bench_results"):
+    storage_kwargs = storage_kwargs or {}
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "llm_latency": llm_latency,
+        "storage_kwargs": storage_kwargs,
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        image_dir = os.path.join(workdir, "images")
+        image_names = make_fixture_images(image_dir)
+        with LocalImageServer(image_dir) as server:
+            for n_notes in sizes:
+                print(f"== {n_notes} 条笔记")
+                report["sizes"][str(n_notes)] = result = bench_size(
+                    n_notes, workdir, server, image_names, llm_latency, repeat, storage_kwargs
+                )
+                print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ 结果已写入 {path}")
+    return report
+
+
+if __name__ == "__main__":
+    run_suite()
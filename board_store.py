@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import re
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+import pandas as pd
+
+NOTE_COLUMNS = ['title', 'content', 'url', 'images']
+
+
+def _board_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".parquet":
+        return "parquet"
+    if ext in (".xlsx", ".xls"):
+        return "excel"
+    raise ValueError(f"unsupported board file format: {path}")
+
+
+class BoardWriter:
+    """
+    把抓到的笔记逐条写入收藏夹文件，images 保存为原生列表而不是字符串：
+    - .jsonl：每条笔记一行，写完立即 flush，中途中断也不会丢已抓到的数据
+    - .parquet：按 row_group_size 条一组写入（需要 pyarrow）
+    - .xlsx：仅作导出，收集后在 close 时一次写出
+    只有 write / close 两个方法，可以直接作为 StreamingIngestPipeline 的 sink。
+    """
+
+    def __init__(self, path: str, row_group_size: int = 512):
+        self.path = path
+        self.format = _board_format(path)
+        self.row_group_size = row_group_size
+        self.count = 0
+        self._rows = []
+        self._file = None
+        self._parquet = None
+
+        if self.format == "jsonl":
+            self._file = open(path, "w", encoding="utf-8")
+        elif self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self._schema = pa.schema([
+                ("title", pa.string()),
+                ("content", pa.string()),
+                ("url", pa.string()),
+                ("images", pa.list_(pa.string())),
+            ])
+            self._parquet = pq.ParquetWriter(path, self._schema)
+
+    def write(self, note: dict):
+        row = {
+            "title": note.get("title") or "",
+            "content": note.get("content") or "",
+            "url": note["url"],
+            "images": list(note.get("images") or []),
+        }
+        self.count += 1
+        if self.format == "jsonl":
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._file.flush()
+            return
+        self._rows.append(row)
+        if self.format == "parquet" and len(self._rows) >= self.row_group_size:
+            self._flush_parquet()
+
+    def _flush_parquet(self):
+        import pyarrow as pa
+
+        if self._rows:
+            self._parquet.write_table(pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        if self.format == "jsonl":
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        elif self.format == "parquet":
+            if self._parquet is not None:
+                self._flush_parquet()
+                self._parquet.close()
+                self._parquet = None
+        else:
+            df = pd.DataFrame(self._rows, columns=NOTE_COLUMNS)
+            df["images"] = df["images"].map(str)
+            df.to_excel(self.path, index=False)
+        print(f"数据已保存至 {self.path}，共 {self.count} 条记录")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_board_batches(path: str, batch_size: int = 256) -> Iterator[pd.DataFrame]:
+    """
+    按批读取收藏夹文件，每批是最多 batch_size 行的 DataFrame（title / content / url / images），
+    images 为 list。jsonl 和 parquet 逐批读取，内存只和 batch_size 有关；
+    Excel 是旧格式，只能整表读入后再切分。按 url 去重，保留第一次出现的笔记。
+    """
+    seen = set()
+
+    def dedupe(rows):
+        batch = []
+        for row in rows:
+            if row["url"] in seen:
+                continue
+            seen.add(row["url"])
+            batch.append(row)
+        return pd.DataFrame(batch, columns=NOTE_COLUMNS)
+
+    fmt = _board_format(path)
+    if fmt == "jsonl":
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rows.append(json.loads(line))
+                if len(rows) >= batch_size:
+                    yield dedupe(rows)
+                    rows = []
+        if rows:
+            yield dedupe(rows)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=NOTE_COLUMNS):
+            yield dedupe(record_batch.to_pylist())
+    else:
+        from ocr_pipeline import parse_image_list
+
+        print(f"⚠️ {path} 是 Excel 格式，只能整表读入；建议改用 .jsonl 或 .parquet")
+        df = pd.read_excel(path)
+        for start in range(0, len(df), batch_size):
+            rows = df.iloc[start:start + batch_size].to_dict("records")
+            for row in rows:
+                try:
+                    row["images"] = parse_image_list(row.get("images"))
+                except Exception:
+                    row["images"] = []
+            yield dedupe(rows)
+
+
+def board_file_for(board_url: str, base: str = "./xiaohongshu_board", ext: str = ".jsonl") -> str:
+    """
+    每个收藏夹单独一个文件：{base}_{收藏夹 id}{ext}。BoardWriter 以 "w" 模式打开文件，
+    多个收藏夹共用一个文件时，同步一个就会清空另一个的内容。
+    """
+    path = urlparse(board_url).path.rstrip("/")
+    board_id = re.sub(r"[^0-9A-Za-z_-]", "", path.rsplit("/", 1)[-1])
+    if not board_id:
+        board_id = hashlib.sha1(board_url.encode("utf-8")).hexdigest()[:16]
+    return f"{base}_{board_id}{ext}"
+
+
+def find_board_file(base: str = "./xiaohongshu_board", preferred: Optional[str] = None) -> str:
+    """按 jsonl → parquet → xlsx 的顺序查找已有的收藏夹文件。"""
+    if preferred:
+        return preferred
+    for ext in (".jsonl", ".parquet", ".xlsx"):
+        if os.path.exists(base + ext):
+            return base + ext
+    raise FileNotFoundError(f"no board file found for {base}(.jsonl|.parquet|.xlsx)")
@@ -0,0 +1,58 @@
+import re
+from typing import List
+
+# 一个 CJK 字符或一个拉丁单词/数字串算一个单位，与 MiniLM 分词后的 token 数大致相当
+_CJK = "\u3400-\u9fff\uf900-\ufaff"
+_UNIT_RE = re.compile(rf"[{_CJK}]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_{_CJK}]")
+_SENTENCE_END = set("。！？!?.;；")
+
+
+def split_into_chunks(text: str, chunk_size: int = 100, overlap: int = 20) -> List[str]:
+    """
+    把长文本切成有重叠的片段，每段不超过 chunk_size 个单位，保证不会被 MiniLM 截断。
+    尽量在句末标点处断开；相邻片段重叠 overlap 个单位，避免把一句话拆散后两边都检索不到。
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    units = list(_UNIT_RE.finditer(text))
+    if len(units) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(units):
+        end = min(start + chunk_size, len(units))
+        if end < len(units):
+            # 在窗口后 30% 的范围内找最近的句末标点
+            for k in range(end - 1, start + int(chunk_size * 0.7) - 1, -1):
+                if units[k].group() in _SENTENCE_END:
+                    end = k + 1
+                    break
+        chunk = text[units[start].start():units[end - 1].end()].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(units):
+            break
+        start = max(end - overlap, start + 1)
+        # 重叠部分不要以标点开头
+        while start < end and units[start].group() in _SENTENCE_END:
+            start += 1
+    return chunks
+
+
+def count_units(text: str) -> int:
+    """粗略估计 token 数：CJK 字符和拉丁单词各算一个。"""
+    return len(_UNIT_RE.findall(text or ""))
+
+
+def truncate_units(text: str, max_units: int) -> str:
+    """截断到不超过 max_units 个单位；省略号本身算一个单位，占用预算。"""
+    units = list(_UNIT_RE.finditer(text or ""))
+    if len(units) <= max_units:
+        return text
+    if max_units <= 0:
+        return ""
+    if max_units == 1:
+        return text[:units[0].end()].strip()
+    return text[:units[max_units - 2].end()].rstrip() + "…"
@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from chunking import count_units, truncate_units
+
+
+class ContextPacker:
+    """
+    检索结果与 QA chain 之间的上下文组装：
+    按最大边际相关性（MMR）排序候选文档，去掉近似重复的段落，
+    再在 token 预算内装填，单篇过长时截断。
+    相关性用检索阶段的融合分数，文档之间的相似度用 Milvus 返回的向量计算。
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        max_doc_tokens: int = 400,
+        min_doc_tokens: int = 40,
+        mmr_lambda: float = 0.7,
+        dedupe_threshold: float = 0.95,
+    ):
+        self.token_budget = token_budget
+        self.max_doc_tokens = max_doc_tokens
+        self.min_doc_tokens = min_doc_tokens
+        self.mmr_lambda = mmr_lambda
+        self.dedupe_threshold = dedupe_threshold
+
+    def _mmr_order(self, relevance: np.ndarray, vectors: Optional[np.ndarray]) -> List[int]:
+        if vectors is None:
+            return list(np.argsort(-relevance, kind="stable"))
+
+        sims = vectors @ vectors.T
+        remaining = list(range(len(relevance)))
+        selected = []
+        while remaining:
+            if selected:
+                redundancy = sims[np.ix_(remaining, selected)].max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining))
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(scores))
+            idx = remaining.pop(best)
+            # 与已选文档几乎相同的段落直接丢弃
+            if selected and redundancy[best] >= self.dedupe_threshold:
+                continue
+            selected.append(idx)
+        return selected
+
+    def pack(self, docs: List[Document], vectors: Dict = None) -> Tuple[List[Document], dict]:
+        """
+        Args:
+            docs: 已按融合分数排好序的候选文档，metadata 中带 id 和 score
+            vectors: {id: 向量}，缺失时退化为只按相关性排序
+        Returns:
+            (装填后的文档, 统计 candidates / kept / tokens / budget)；
+            packer 被并发请求共享，统计随返回值给出而不保存在实例上
+        """
+        if not docs:
+            return [], {"candidates": 0, "kept": 0, "tokens": 0, "budget": self.token_budget}
+
+        relevance = np.array([doc.metadata.get("score", 0.0) for doc in docs], dtype=np.float32)
+        if relevance.max() > 0:
+            relevance = relevance / relevance.max()
+
+        matrix = None
+        if vectors and all(doc.metadata.get("id") in vectors for doc in docs):
+            matrix = np.stack([np.asarray(vectors[doc.metadata["id"]], dtype=np.float32) for doc in docs])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+
+        packed = []
+        used = 0
+        for idx in self._mmr_order(relevance, matrix):
+            doc = docs[idx]
+            remaining = self.token_budget - used
+            limit = min(self.max_doc_tokens, remaining)
+            if limit < self.min_doc_tokens:
+                break
+            content = truncate_units(doc.page_content, limit)
+            used += count_units(content)
+            packed.append(Document(page_content=content, metadata=dict(doc.metadata)))
+
+        stats = {"candidates": len(docs), "kept": len(packed), "tokens": used, "budget": self.token_budget}
+        print(f"🧮 上下文: {len(packed)}/{len(docs)} 篇文档，约 {used}/{self.token_budget} tokens")
+        return packed, stats
@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+
+
+def default_checkpoint_path(board_url: str) -> str:
+    board_id = board_url.rstrip("/").split("/")[-1].split("?")[0]
+    return f".crawl_checkpoint_{board_id}.jsonl"
+
+
+class CrawlCheckpoint:
+    """
+    抓取断点文件（追加写入的 JSONL）：记录已收集的链接、已完成的笔记和失败原因。
+    每条事件写入后立即 flush，浏览器崩溃或登录失效时最多丢失正在抓取的那一条。
+    """
+
+    def __init__(self, path: str, board_url: str = None, resume: bool = True):
+        self.path = path
+        self.board_url = board_url
+        self.links = []
+        self.done = {}      # url -> note dict
+        self.failed = {}    # url -> 失败原因
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+        elif os.path.exists(path):
+            os.remove(path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 崩溃时可能留下半行
+                kind = event.get("type")
+                if kind == "links":
+                    if self.board_url and event.get("board_url") not in (None, self.board_url):
+                        continue
+                    self.links = event["links"]
+                elif kind == "done":
+                    note = event["note"]
+                    self.done[note["url"]] = note
+                    self.failed.pop(note["url"], None)
+                elif kind == "failed":
+                    if event["url"] not in self.done:
+                        self.failed[event["url"]] = event["reason"]
+
+    def _append(self, event: dict):
+        with self._lock:
+            self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def save_links(self, links):
+        self.links = list(links)
+        self._append({"type": "links", "board_url": self.board_url, "links": self.links})
+
+    def mark_done(self, note: dict):
+        self.done[note["url"]] = note
+        self.failed.pop(note["url"], None)
+        self._append({"type": "done", "note": note})
+
+    def mark_failed(self, url: str, reason):
+        self.failed[url] = str(reason)
+        self._append({"type": "failed", "url": url, "reason": str(reason)})
+
+    def pending(self, links=None):
+        """还需要抓取的链接：未完成的（包括之前失败、需要重试的）。"""
+        links = self.links if links is None else links
+        return [link for link in links if link not in self.done]
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def summary(self) -> dict:
+        return {"links": len(self.links), "done": len(self.done), "failed": len(self.failed)}
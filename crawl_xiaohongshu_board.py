@@ -1,52 +1,151 @@
-from playwright.sync_api import sync_playwright
 import time
 import random
 import pandas as pd
 from tqdm import tqdm
 import os
+import asyncio
+import inspect
+import queue
+import threading
+from urllib.parse import urljoin
 
-def crawl_xiaohongshu_board(board_url, excel_path='xiaohongshu_board.xlsx'):
+from board_store import NOTE_COLUMNS, BoardWriter
+from crawl_checkpoint import CrawlCheckpoint, default_checkpoint_path
+from rate_limit import TokenBucket, backoff_delay
+from tracing import TRACER
+
+XHS_BASE_URL = "https://www.xiaohongshu.com"
+USER_DATA_DIR = os.path.join(os.path.expanduser("~"), ".config", "xiaohongshu-browser")
+BROWSER_OPTIONS = dict(
+    viewport={'width': 1920, 'height': 1080},
+    user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+)
+
+# 收藏夹页：一次性取出所有笔记卡片的链接
+NOTE_LINKS_JS = '''
+    () => Array.from(document.querySelectorAll('section.note-item a.cover.mask.ld')).map(a => a.getAttribute('href'))
+'''
+
+# 滚动后判断是否有新卡片：卡片数变化或最后一张卡片的链接变化（列表可能是虚拟滚动）
+NOTE_CHANGED_JS = '''
+    ([n, last]) => {
+        const items = document.querySelectorAll('section.note-item a.cover.mask.ld');
+        return items.length !== n || (items.length > 0 && items[items.length - 1].getAttribute('href') !== last);
+    }
+'''
+
+# 详情页：提取标题、内容和图片URL（image_urls是字符串列表）
+NOTE_DETAIL_JS = '''
+    () => {
+        // 已加载的图片按实际尺寸过滤掉图标、表情和 UI 小图（未加载完的 naturalWidth 为 0，保留）
+        const isTiny = img => img.naturalWidth > 0 && (img.naturalWidth < 120 || img.naturalHeight < 120);
+        const raw_imgs = Array.from(document.querySelectorAll('img'))
+            .filter(img => !isTiny(img))
+            .map(img => img.src)
+            .filter(src =>
+                src.startsWith('http') &&
+                !src.includes('/avatar/')
+            );
+
+        const clean_url = url => url.split('?')[0].split('|')[0];
+        const seen = new Set();
+        const deduped = [];
+
+        for (const url of raw_imgs) {
+            const base = clean_url(url);
+            if (!seen.has(base)) {
+                seen.add(base);
+                deduped.push(url);
+            }
+        }
+
+        const title = document.querySelector('.title')?.innerText?.trim() || '';
+        const content = document.querySelector('.note-text')?.innerText?.trim() || '';
+        return [title, content, deduped];
+    }
+'''
+
+
+def _new_links(note_elements, all_data, base_url):
+    """把本次滚动看到的链接中此前没见过的登记到 all_data 并返回；同一页上重复的卡片只算一次。"""
+    new_links = []
+    for href in note_elements:
+        if not href:
+            continue
+        link = urljoin(base_url, href)
+        if link not in all_data:
+            all_data[link] = None
+            new_links.append(link)
+    return new_links
+
+
+def _last_note_marker(note_elements):
+    return [len(note_elements), note_elements[-1] if note_elements else None]
+
+
+def sign_in(page):
+    # 检查是否已经登录
+    page.goto(XHS_BASE_URL)
+    try:
+        # 尝试查找登录按钮，如果找不到说明已经登录
+        page.wait_for_selector("text=登录", timeout=5000)
+        print("未检测到登录状态，请在弹出的浏览器窗口中完成登录...")
+        input("登录完成后请在终端按回车继续...")
+    except:
+        print("检测到已登录状态，继续执行...")
+
+
+def scroll_and_collect(page, base_url=XHS_BASE_URL, max_notes=None, patience=3,
+                       wait_timeout=5000, max_scrolls=500, stale_timeout=1000):
     """
-    爬取小红书收藏夹内容
+    自适应滚动收集笔记链接：每次滚动后等待新的 section.note-item 出现（DOM 变化），
+    等不到再退回到 networkidle；连续 patience 次滚动没有新链接就停止。
     Args:
-        board_url: 收藏夹URL
-        excel_path: Excel文件保存路径，默认为'xiaohongshu_board.xlsx'
+        max_notes: 收集到这么多链接就提前停止，None 表示不限
+        patience: 连续多少次滚动没有新链接后停止
+        wait_timeout: 每次滚动后等待新内容的最长毫秒数
+        stale_timeout: 上一次滚动已经没有新链接时（多半到底了）改用的较短等待，且不再等 networkidle
     Returns:
-        pd.DataFrame: 包含标题、内容和URL的DataFrame
+        list[str]: 按发现顺序排列的笔记链接
     """
-    def sign_in(page):
-        # 检查是否已经登录
-        page.goto("https://www.xiaohongshu.com")
+    print("开始滚动页面并收集链接...")
+    all_data = {}
+    per_scroll = []
+    stale = 0
+    for i in range(max_scrolls):
+        # 使用JavaScript一次性获取所有链接，提高效率
+        note_elements = page.evaluate(NOTE_LINKS_JS)
+        new_links = _new_links(note_elements, all_data, base_url)
+        per_scroll.append(len(new_links))
+        print(f"scroll {i+1}: 找到 {len(new_links)} 个新链接，总计 {len(all_data)} 个")
+
+        if max_notes and len(all_data) >= max_notes:
+            break
+        stale = 0 if new_links else stale + 1
+        if stale >= patience:
+            break
+
+        # 滚动到底部，等待新卡片出现而不是固定 sleep
+        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
         try:
-            # 尝试查找登录按钮，如果找不到说明已经登录
-            page.wait_for_selector("text=登录", timeout=5000)
-            print("未检测到登录状态，请在弹出的浏览器窗口中完成登录...")
-            input("登录完成后请在终端按回车继续...")
-        except:
-            print("检测到已登录状态，继续执行...")
-
-    def scroll_and_collect(page, times=1):
-        print("开始滚动页面并收集链接...")
-        all_data = set()
-        for i in tqdm(range(times), desc="滚动中"):
-            # 使用JavaScript一次性获取所有链接，提高效率
-            note_elements = page.evaluate('''
-                () => Array.from(document.querySelectorAll('section.note-item a.cover.mask.ld')).map(a => a.getAttribute('href'))
-            ''')
-            
-            new_links = {f"https://www.xiaohongshu.com{href}" for href in note_elements if href}
-            all_data.update(new_links)
-            print(f"epoch {i+1}: 找到 {len(new_links)} 个新链接，总计 {len(all_data)} 个")
-
-            # 滚动到底部
-            page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            time.sleep(3)  # 保持3秒等待时间确保内容加载
-
-        return list(all_data)
-
-    def extract_detail(page, note_url, retry_count=2):
-        for attempt in range(retry_count):
-            try:
+            page.wait_for_function(NOTE_CHANGED_JS, arg=_last_note_marker(note_elements),
+                                   timeout=stale_timeout if stale else wait_timeout)
+        except Exception:
+            if not stale:
+                try:
+                    page.wait_for_load_state("networkidle", timeout=wait_timeout)
+                except Exception:
+                    pass
+
+    print(f"滚动结束：共 {len(per_scroll)} 次，每次新链接数 {per_scroll}")
+    links = list(all_data)
+    return links[:max_notes] if max_notes else links
+
+
+def extract_detail(page, note_url, retry_count=2, on_error=None):
+    for attempt in range(retry_count):
+        try:
+            with TRACER.span("crawl.page_load", attempt=attempt):
                 # 加快页面加载
                 page.goto(note_url, wait_until='domcontentloaded', timeout=8000)
 
@@ -54,90 +153,398 @@ def crawl_xiaohongshu_board(board_url, excel_path='xiaohongshu_board.xlsx'):
                 page.wait_for_selector(".title", timeout=5000)
                 page.wait_for_selector(".note-text", timeout=5000)
 
-                # 提取标题、内容和图片URL（image_urls是字符串列表）
-                data = page.evaluate('''
-                    () => {
-                        const raw_imgs = Array.from(document.querySelectorAll('img'))
-                            .map(img => img.src)
-                            .filter(src =>
-                                src.startsWith('http') &&
-                                !src.includes('/avatar/')
-                            );
-
-                        const clean_url = url => url.split('?')[0].split('|')[0];
-                        const seen = new Set();
-                        const deduped = [];
-
-                        for (const url of raw_imgs) {
-                            const base = clean_url(url);
-                            if (!seen.has(base)) {
-                                seen.add(base);
-                                deduped.push(url);
-                            }
-                        }
-
-                        const title = document.querySelector('.title')?.innerText?.trim() || '';
-                        const content = document.querySelector('.note-text')?.innerText?.trim() || '';
-                        return [title, content, deduped];
-                    }
-                ''')
-
-                if data and (data[0] or data[1]):
-                    return [data[0], data[1], note_url, data[2]]  # 返回：标题、内容、URL、图片列表
-
-                if attempt < retry_count - 1:
-                    time.sleep(1)
+            data = page.evaluate(NOTE_DETAIL_JS)
 
-            except Exception as e:
-                if attempt < retry_count - 1:
-                    print(f"第 {attempt + 1} 次抓取失败: {note_url} | 将重试")
-                    time.sleep(2)
-                else:
-                    print(f"抓取详情失败: {note_url} | 原因: {e}")
+            if data and (data[0] or data[1]):
+                return [data[0], data[1], note_url, data[2]]  # 返回：标题、内容、URL、图片列表
+
+            if attempt < retry_count - 1:
+                time.sleep(1)
+            elif on_error is not None:
+                on_error("标题和内容为空")
+
+        except Exception as e:
+            if attempt < retry_count - 1:
+                print(f"第 {attempt + 1} 次抓取失败: {note_url} | 将重试")
+                time.sleep(2)
+            else:
+                print(f"抓取详情失败: {note_url} | 原因: {e}")
+                TRACER.incr("crawl_failures")
+                if on_error is not None:
+                    on_error(e)
+    return None
+
+
+def _open_checkpoint(board_url, checkpoint_path, resume):
+    if not (checkpoint_path or resume):
         return None
+    checkpoint = CrawlCheckpoint(checkpoint_path or default_checkpoint_path(board_url), board_url, resume=resume)
+    if resume:
+        print(f"从断点恢复: {checkpoint.summary()}")
+    return checkpoint
+
+
+def iter_xiaohongshu_board(board_url, max_notes=None, checkpoint_path=None, resume=False, on_links=None):
+    """
+    逐条产出收藏夹笔记，抓到一条就 yield 一条，供流式入库使用
+    Args:
+        board_url: 收藏夹URL
+        max_notes: 最多抓取的笔记数，None 表示整个收藏夹
+        checkpoint_path: 断点文件路径，记录链接、已完成笔记和失败原因
+        resume: 从断点恢复，跳过已完成的笔记，只重试失败和未抓取的链接
+        on_links: 收集完收藏夹的全部链接后回调一次（包括详情抓取失败的），
+                  用于判断哪些笔记已从收藏夹移除
+    Yields:
+        dict: {'title', 'content', 'url', 'images'}
+    """
+    checkpoint = _open_checkpoint(board_url, checkpoint_path, resume)
+    p = browser = None
+    try:
+        # 断点里已完成的笔记直接产出，不再访问详情页
+        seen = set()
+        if checkpoint is not None:
+            for note in checkpoint.done.values():
+                seen.add(note["url"])
+                yield note
+            if checkpoint.links and not checkpoint.pending():
+                if on_links is not None:
+                    on_links(list(checkpoint.links))
+                print("断点中的笔记已全部抓取完成")
+                return
+
+        from playwright.sync_api import sync_playwright
+
+        # 不使用 with 语句，直接创建 playwright 实例（使用持久化上下文）；
+        # 生成器耗尽或被关闭时在 finally 中关闭，同一进程再抓下一个收藏夹时才能重新打开同一个用户目录
+        p = sync_playwright().start()
+        browser = p.chromium.launch_persistent_context(USER_DATA_DIR, headless=False, **BROWSER_OPTIONS)
+        page = browser.new_page()
+        
+        sign_in(page)
+        
+        if checkpoint is not None and checkpoint.links:
+            note_links = checkpoint.links
+        else:
+            page.goto(board_url)
+            print("正在加载收藏夹内容...")
+            try:
+                page.wait_for_selector("section.note-item", timeout=10000)
+            except Exception:
+                print("⚠️ 收藏夹为空或加载超时")
+            note_links = scroll_and_collect(page, max_notes=max_notes)
+            if checkpoint is not None:
+                checkpoint.save_links(note_links)
+        if on_links is not None:
+            on_links(list(note_links))
+        if checkpoint is not None:
+            note_links = checkpoint.pending(note_links)
+        
+        print("开始抓取详情页内容...")
+        for link in tqdm(note_links, desc="详情抓取"):
+            time.sleep(random.uniform(1, 2))  # 减少等待时间
+            on_error = (lambda e, url=link: checkpoint.mark_failed(url, e)) if checkpoint else None
+            detail = extract_detail(page, link, on_error=on_error)
+            if detail and detail[2] not in seen:
+                seen.add(detail[2])
+                note = dict(zip(NOTE_COLUMNS, detail))
+                if checkpoint is not None:
+                    checkpoint.mark_done(note)
+                yield note
+
+        if checkpoint is not None:
+            print(f"断点状态: {checkpoint.summary()}")
+        print("爬虫任务完成！")
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception as e:
+                print(f"⚠️ 关闭浏览器失败: {e}")
+        if p is not None:
+            p.stop()
+
+
+def crawl_xiaohongshu_board(board_url, excel_path=None, concurrency=None, max_notes=None,
+                            output_path='xiaohongshu_board.jsonl', **crawl_kwargs):
+    """
+    爬取小红书收藏夹内容
+    Args:
+        board_url: 收藏夹URL
+        excel_path: 额外导出的 Excel 文件路径，默认不导出；Excel 只用于查看，入库请用 output_path
+        concurrency: 不为 None 时使用 async Playwright 多页面并发抓取
+        max_notes: 最多抓取的笔记数，None 表示整个收藏夹
+        output_path: 收藏夹文件路径，.jsonl（默认）或 .parquet，抓到一条写一条，images 为原生列表；
+                     为 None 时不保存
+        crawl_kwargs: 其他抓取参数，如断点 checkpoint_path / resume，并发模式下的 rate、burst 等
+    Returns:
+        pd.DataFrame: 包含标题、内容和URL的DataFrame
+    """
+    if concurrency:
+        notes = iter_xiaohongshu_board_concurrent(board_url, concurrency=concurrency, max_notes=max_notes,
+                                                  **crawl_kwargs)
+    else:
+        notes = iter_xiaohongshu_board(board_url, max_notes=max_notes, **crawl_kwargs)
 
-    # 使用持久化上下文
-    user_data_dir = os.path.join(os.path.expanduser("~"), ".config", "xiaohongshu-browser")
-    
-    # 不使用 with 语句，直接创建 playwright 实例
-    p = sync_playwright().start()
-    browser = p.chromium.launch_persistent_context(
-        user_data_dir,
-        headless=False,
-        viewport={'width': 1920, 'height': 1080},
-        user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    )
-    page = browser.new_page()
-    
-    sign_in(page)
-    
-    page.goto(board_url)
-    print("正在加载收藏夹内容...")
-    time.sleep(3)  # 减少初始等待时间
-    
-    note_links = scroll_and_collect(page, times=2)
-    
-    print("开始抓取详情页内容...")
+    writers = [BoardWriter(path) for path in (output_path, excel_path) if path]
     all_contents = []
-    for link in tqdm(note_links, desc="详情抓取"):
-        time.sleep(random.uniform(1, 2))  # 减少等待时间
-        detail = extract_detail(page, link)
-        if detail:
-            all_contents.append(detail)
-    
-    # 创建DataFrame
-    df = pd.DataFrame(all_contents, columns=['title', 'content', 'url', 'images'])
-    df = df.drop_duplicates(subset=["url"])
-
-    
-    # 保存到Excel
-    df.to_excel(excel_path, index=False)
-    print(f"数据已保存至 {excel_path}，共 {len(df)} 条记录")
-    
-    print("爬虫任务完成！浏览器保持打开状态，可以继续使用。")
-    print("如果要关闭浏览器，请手动关闭浏览器窗口。")
-    
-    return df
+    seen = set()
+    try:
+        for note in notes:
+            if note["url"] in seen:
+                continue
+            seen.add(note["url"])
+            all_contents.append(note)
+            for writer in writers:
+                writer.write(note)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    return pd.DataFrame(all_contents, columns=NOTE_COLUMNS)
+
+
+# ---------- 并发抓取（async Playwright） ----------
+async def sign_in_async(page, base_url=XHS_BASE_URL):
+    await page.goto(base_url)
+    try:
+        await page.wait_for_selector("text=登录", timeout=5000)
+        print("未检测到登录状态，请在弹出的浏览器窗口中完成登录...")
+        await asyncio.to_thread(input, "登录完成后请在终端按回车继续...")
+    except Exception:
+        print("检测到已登录状态，继续执行...")
+
+
+async def scroll_and_collect_async(page, base_url=XHS_BASE_URL, max_notes=None, patience=3,
+                                   wait_timeout=5000, max_scrolls=500, stale_timeout=1000):
+    all_data = {}
+    per_scroll = []
+    stale = 0
+    for i in range(max_scrolls):
+        note_elements = await page.evaluate(NOTE_LINKS_JS)
+        new_links = _new_links(note_elements, all_data, base_url)
+        per_scroll.append(len(new_links))
+        print(f"scroll {i+1}: 找到 {len(new_links)} 个新链接，总计 {len(all_data)} 个")
+
+        if max_notes and len(all_data) >= max_notes:
+            break
+        stale = 0 if new_links else stale + 1
+        if stale >= patience:
+            break
+
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        try:
+            await page.wait_for_function(NOTE_CHANGED_JS, arg=_last_note_marker(note_elements),
+                                         timeout=stale_timeout if stale else wait_timeout)
+        except Exception:
+            if not stale:
+                try:
+                    await page.wait_for_load_state("networkidle", timeout=wait_timeout)
+                except Exception:
+                    pass
+
+    print(f"滚动结束：共 {len(per_scroll)} 次，每次新链接数 {per_scroll}")
+    links = list(all_data)
+    return links[:max_notes] if max_notes else links
+
+
+async def extract_detail_async(page, note_url, limiter, retry_count=3, on_error=None):
+    """单条笔记详情，每次请求前先从共享令牌桶取令牌，失败后按抖动指数退避重试。"""
+    for attempt in range(retry_count):
+        await limiter.acquire_async()
+        try:
+            with TRACER.span("crawl.page_load", attempt=attempt):
+                await page.goto(note_url, wait_until='domcontentloaded', timeout=8000)
+                await page.wait_for_selector(".title", timeout=5000)
+                await page.wait_for_selector(".note-text", timeout=5000)
+            data = await page.evaluate(NOTE_DETAIL_JS)
+            if data and (data[0] or data[1]):
+                return [data[0], data[1], note_url, data[2]]
+            error = "标题和内容为空"
+        except Exception as e:
+            error = e
+
+        if attempt < retry_count - 1:
+            print(f"第 {attempt + 1} 次抓取失败: {note_url} | 将重试")
+            await asyncio.sleep(backoff_delay(attempt))
+        else:
+            print(f"抓取详情失败: {note_url} | 原因: {error}")
+            TRACER.incr("crawl_failures")
+            if on_error is not None:
+                on_error(error)
+    return None
+
+
+async def _call_on_note(on_note, note):
+    result = on_note(note)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def acrawl_xiaohongshu_board(
+    board_url,
+    concurrency=4,
+    rate=1.0,
+    burst=2,
+    on_note=None,
+    max_notes=None,
+    base_url=XHS_BASE_URL,
+    require_login=True,
+    headless=False,
+    user_data_dir=USER_DATA_DIR,
+    checkpoint_path=None,
+    resume=False,
+    on_links=None,
+):
+    """
+    在同一个持久化上下文里开 concurrency 个页面并发抓取详情页
+    Args:
+        board_url: 收藏夹URL
+        concurrency: 并发页面数
+        rate / burst: 所有页面共享的令牌桶，平均每秒请求数和允许的突发数
+        on_note: 每抓到一条笔记就回调一次（可用于流式入库），可以是普通函数或 async 函数
+        max_notes: 最多抓取的笔记数，None 表示整个收藏夹
+        base_url: 笔记相对链接的前缀，指向本地静态服务器时可用于测试
+        require_login: 是否先检查登录状态
+        checkpoint_path / resume / on_links: 同 iter_xiaohongshu_board
+    Returns:
+        list[dict]: {'title', 'content', 'url', 'images'}
+    """
+    from playwright.async_api import async_playwright
+
+    checkpoint = _open_checkpoint(board_url, checkpoint_path, resume)
+    results = []
+    seen = set()
+    if checkpoint is not None:
+        for note in checkpoint.done.values():
+            seen.add(note["url"])
+            results.append(note)
+            if on_note is not None:
+                await _call_on_note(on_note, note)
+        if checkpoint.links and not checkpoint.pending():
+            if on_links is not None:
+                on_links(list(checkpoint.links))
+            print("断点中的笔记已全部抓取完成")
+            checkpoint.close()
+            return results
+
+    limiter = TokenBucket(rate=rate, burst=burst)
+    p = await async_playwright().start()
+    context = await p.chromium.launch_persistent_context(user_data_dir, headless=headless, **BROWSER_OPTIONS)
+    try:
+        page = context.pages[0] if context.pages else await context.new_page()
+        if require_login:
+            await sign_in_async(page, base_url)
+
+        if checkpoint is not None and checkpoint.links:
+            note_links = checkpoint.links
+        else:
+            await page.goto(board_url)
+            print("正在加载收藏夹内容...")
+            try:
+                await page.wait_for_selector("section.note-item", timeout=10000)
+            except Exception:
+                print("⚠️ 收藏夹为空或加载超时")
+            note_links = await scroll_and_collect_async(page, base_url=base_url, max_notes=max_notes)
+            if checkpoint is not None:
+                checkpoint.save_links(note_links)
+        if on_links is not None:
+            on_links(list(note_links))
+        if checkpoint is not None:
+            note_links = checkpoint.pending(note_links)
+
+        links = asyncio.Queue()
+        for link in note_links:
+            links.put_nowait(link)
+
+        progress = tqdm(total=len(note_links), desc="详情抓取")
+
+        async def worker(worker_page):
+            while True:
+                try:
+                    link = links.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                on_error = (lambda e, url=link: checkpoint.mark_failed(url, e)) if checkpoint else None
+                detail = await extract_detail_async(worker_page, link, limiter, on_error=on_error)
+                progress.update(1)
+                if detail and detail[2] not in seen:
+                    seen.add(detail[2])
+                    note = dict(zip(NOTE_COLUMNS, detail))
+                    if checkpoint is not None:
+                        checkpoint.mark_done(note)
+                    results.append(note)
+                    if on_note is not None:
+                        await _call_on_note(on_note, note)
+
+        pages = [page] + [await context.new_page() for _ in range(max(concurrency, 1) - 1)]
+        await asyncio.gather(*(worker(pg) for pg in pages))
+        progress.close()
+        if checkpoint is not None:
+            print(f"断点状态: {checkpoint.summary()}")
+        return results
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        await context.close()
+        await p.stop()
+
+
+class _CrawlStopped(Exception):
+    """消费方不再读取笔记（生成器被关闭），用于终止后台抓取。"""
+
+
+def iter_xiaohongshu_board_concurrent(board_url, queue_size=32, **kwargs):
+    """
+    iter_xiaohongshu_board 的并发版本：在后台线程里跑事件循环，逐条产出笔记；
+    kwargs 传给 acrawl_xiaohongshu_board（包括 on_links，可配合 StreamingIngestPipeline 的 delete_missing）。
+    队列满时 on_note 在线程池里等待，只暂停当前页面的 worker，事件循环照常运行，从而对抓取形成背压；
+    生成器被提前关闭时设置 stop，后台抓取在下一次写队列时退出，不会永远卡住。
+    """
+    notes = queue.Queue(maxsize=queue_size)
+    done = object()
+    errors = []
+    stop = threading.Event()
+
+    def put(item):
+        # 带超时地写队列，期间检查 stop，消费方离开后不会永远阻塞
+        while not stop.is_set():
+            try:
+                notes.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def on_note(note):
+        if not await asyncio.to_thread(put, note):
+            raise _CrawlStopped()
+
+    def run():
+        try:
+            asyncio.run(acrawl_xiaohongshu_board(board_url, on_note=on_note, **kwargs))
+        except _CrawlStopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(done)
+
+    thread = threading.Thread(target=run, name="xhs-async-crawl", daemon=True)
+    thread.start()
+    try:
+        while True:
+            note = notes.get()
+            if note is done:
+                break
+            yield note
+    finally:
+        stop.set()
+    thread.join()
+    if errors:
+        raise errors[0]
+
 
 if __name__ == "__main__":
     # 示例用法
@@ -0,0 +1,54 @@
+import os
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "int8")
+
+
+def load_embedding_model(model_name, backend="torch", num_threads=None, max_seq_length=None, cache_dir=None):
+    """
+    按指定后端加载 SentenceTransformer，返回的对象都有相同的 encode 接口，可直接交给 MilvusStorage。
+    Args:
+        backend: torch（原始 fp32）/ onnx（onnxruntime 推理，需要 sentence-transformers>=3.2 和 optimum）
+                 / int8（对 Linear 层做动态 int8 量化）
+        num_threads: CPU 推理线程数，None 时沿用框架默认值
+        max_seq_length: 截断长度；分块索引下片段都很短，调小可以减少 padding 开销
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"unknown embedding backend: {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+
+    if backend == "onnx":
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if num_threads:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+            model_kwargs["session_options"] = options
+        model = SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs,
+                                    cache_folder=cache_dir)
+    else:
+        import torch
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        model = SentenceTransformer(model_name, device="cpu", cache_folder=cache_dir)
+        if backend == "int8":
+            # 动态量化：权重离线转成 int8，激活值推理时再量化，CPU 上主要加速 Linear 矩阵乘
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if max_seq_length:
+        model.max_seq_length = max_seq_length
+    return model
+
+
+def embedding_backend_from_env():
+    """从环境变量读取后端配置，部署时不改代码即可切换：EMBEDDING_BACKEND / EMBEDDING_THREADS / EMBEDDING_MAX_SEQ_LENGTH。"""
+    threads = os.environ.get("EMBEDDING_THREADS")
+    max_len = os.environ.get("EMBEDDING_MAX_SEQ_LENGTH")
+    return {
+        "backend": os.environ.get("EMBEDDING_BACKEND", "torch"),
+        "num_threads": int(threads) if threads else None,
+        "max_seq_length": int(max_len) if max_len else None,
+    }
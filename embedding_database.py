@@ -1,120 +1,682 @@
-from pymilvus import MilvusClient
-from sentence_transformers import SentenceTransformer
+from pymilvus import DataType, MilvusClient
 import numpy as np
-import pandas as pd
-import pytesseract
-from PIL import Image
-import requests
 from io import BytesIO
-import ast
-from unstructured.partition.image import partition_image
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from chunking import split_into_chunks
+from embedding_backends import load_embedding_model
+from lexical_index import LexicalIndex
+from ocr_cache import OCRCache
+from ocr_pipeline import ParallelOCR, get_shared_session, parse_image_list
+from ocr_preprocess import PreprocessConfig, prepare_for_ocr
+from tracing import TRACER
+
+
+def _as_text(value):
+    # Excel 中的空单元格会读成 NaN
+    return "" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+
+
+def note_id_from_url(url: str) -> int:
+    """由笔记 URL（去掉 ? 之后的 token 参数）生成稳定的非负 int64 主键。"""
+    base = url.split('?')[0].rstrip('/')
+    digest = hashlib.sha1(base.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def chunk_id(note_id: int, chunk_index: int) -> int:
+    digest = hashlib.sha1(f"{note_id}:{chunk_index}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def note_content_hash(title: str, content: str, images, index_config: str = "") -> str:
+    # index_config 记录分块等索引参数，参数变化时所有笔记都会被视为已修改并重建
+    payload = json.dumps([title, content, list(images), index_config], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _clip_utf8(text: str, max_bytes: int) -> str:
+    # VARCHAR 的 max_length 按字节计算，超长的 OCR 文本截断后再写入
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    return data[:max_bytes].decode("utf-8", errors="ignore")
+
+
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+# search / search_batch 未显式给出 similarity_threshold 时：vector / hybrid 用 0.5，lexical 不过滤（不需要 encode）
+DEFAULT_SIMILARITY_THRESHOLD = 0.5
+_DEFAULT_THRESHOLD = object()
+
+# VARCHAR 字段的最大字节数
+FIELD_MAX_LENGTH = {"title": 1024, "content": 65535, "url": 2048, "content_hash": 64}
 
 
 class MilvusStorage:
-    def __init__(self, collection_name="xiaohongshu_content", db_path="./milvus_demo.db"):
-        self.client = MilvusClient(db_path)
+    # 写版本文件时的进程内锁；跨进程由 os.replace 的原子替换保证文件内容完整
+    _version_lock = threading.Lock()
+
+    def __init__(self, collection_name="xiaohongshu_content", db_path="./milvus_demo.db",
+                 ocr_download_workers=16, ocr_workers=None, ocr_image_deadline=30,
+                 ocr_cache_path="./ocr_cache.db", ocr_preprocess=PreprocessConfig(), client=None, model=None,
+                 chunk_size=None, chunk_overlap=20, chunk_fanout=4,
+                 lexical_index=None, search_mode="vector", rrf_k=60,
+                 metric_type="COSINE", index_type=None, index_params=None, search_params=None,
+                 scalar_index_fields=("url", "title", "note_id"),
+                 embedding_backend="torch", embedding_threads=None, max_seq_length=None):
+        # client / model 可以由外部传入（见 resources.ResourceRegistry），多个实例共享同一份资源
+        self._owns_client = client is None
+        self.client = client if client is not None else MilvusClient(db_path)
         self.collection_name = collection_name
+        self.db_path = db_path
         self.dim = 384  # MiniLM-L12-v2 输出维度
 
+        # 向量索引参数：index_type / index_params 只在建 collection 时生效，search_params 每次检索都会带上
+        # （如 HNSW 的 {"ef": 64}、IVF 的 {"nprobe": 16}）；milvus-lite 只支持 FLAT
+        self.metric_type = metric_type
+        self.index_type = index_type or ("FLAT" if db_path.endswith(".db") else "HNSW")
+        self.index_params = index_params if index_params is not None else (
+            {"M": 16, "efConstruction": 200} if self.index_type == "HNSW" else {}
+        )
+        self.search_params = search_params or {}
+
         if not self.client.has_collection(collection_name):
-            self.client.create_collection(
-                collection_name=collection_name,
-                dimension=self.dim
-            )
+            self._create_collection(scalar_index_fields)
+        else:
+            # 已有 collection 以它建索引时的 metric 为准（旧版 quick setup 建的 collection 也是 COSINE）
+            try:
+                info = self.client.describe_index(collection_name, index_name="vector")
+                self.metric_type = info.get("metric_type", self.metric_type)
+            except Exception:
+                pass
+
+        # embedding 后端：torch / onnx / int8，见 embedding_backends.load_embedding_model
+        self.model = model if model is not None else load_embedding_model(
+            EMBEDDING_MODEL_NAME, backend=embedding_backend,
+            num_threads=embedding_threads, max_seq_length=max_seq_length
+        )
+
+        # 并发 OCR 参数，线程池/进程池在第一次 insert_data 时才创建
+        self.ocr_download_workers = ocr_download_workers
+        self.ocr_workers = ocr_workers
+        self.ocr_image_deadline = ocr_image_deadline
+        # 图片内容不会变，OCR 结果落盘缓存；ocr_cache_path=None 时关闭缓存
+        self.ocr_cache = OCRCache(ocr_cache_path) if ocr_cache_path else None
+        # OCR 前处理（缩小 + 灰度、跳过小图/无文字图、相同内容去重），None 时原图直接识别
+        self.ocr_preprocess = ocr_preprocess
 
-        self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        # 分块索引：chunk_size 不为 None 时每条笔记切成有重叠的片段分别向量化，
+        # 每个片段带上所属笔记的 note_id；检索时每条笔记最多取 top_k * chunk_fanout 个片段再按笔记聚合
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunk_fanout = chunk_fanout
+
+        # collection 的数据版本保存在 db 旁边的文件里，其他进程（initialize_milvus、另一个前端 worker）
+        # 写入后同样能让本进程的答案缓存和 BM25 索引失效
+        self._version_path = self._sidecar_path("version")
+
+        # 本地 BM25 倒排索引，与 collection 同步写入和删除；search_mode 为默认检索方式
+        # （vector / lexical / hybrid），hybrid 用 reciprocal-rank fusion 合并两路结果。
+        # lexical_index=None 时只在 search_mode 需要时启用；索引记录对应的 collection 版本，
+        # 其他进程写入后版本不一致，下次 lexical / hybrid 检索前重建
+        self.search_mode = search_mode
+        self.rrf_k = rrf_k
+        self.lexical = None
+        self._lexical_lock = threading.Lock()
+        if lexical_index is None:
+            lexical_index = search_mode != "vector"
+        if lexical_index:
+            index_path = self._sidecar_path("bm25.pkl")
+            is_new = not os.path.exists(index_path)
+            self.lexical = LexicalIndex(index_path)
+            if is_new:
+                self.rebuild_lexical_index()
+            else:
+                self._sync_lexical_index()
+
+    def _create_collection(self, scalar_index_fields):
+        """显式 schema：固定字段带类型和长度，dynamic field 保留给以后新增的元数据。"""
+        schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=True)
+        schema.add_field("id", DataType.INT64, is_primary=True)
+        schema.add_field("vector", DataType.FLOAT_VECTOR, dim=self.dim)
+        schema.add_field("note_id", DataType.INT64)
+        schema.add_field("chunk_index", DataType.INT64)
+        for name, max_length in FIELD_MAX_LENGTH.items():
+            schema.add_field(name, DataType.VARCHAR, max_length=max_length)
+
+        index_params = self.client.prepare_index_params()
+        index_params.add_index(
+            field_name="vector",
+            index_name="vector",
+            index_type=self.index_type,
+            metric_type=self.metric_type,
+            params=self.index_params,
+        )
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            schema=schema,
+            index_params=index_params,
+        )
+
+        # url / title / note_id 上的标量索引，加速按条件 query / delete 和增量同步的哈希查询；
+        # 后端不支持标量索引时（如部分 milvus-lite 版本）退化为全表扫描
+        for field in scalar_index_fields:
+            scalar_params = self.client.prepare_index_params()
+            scalar_params.add_index(field_name=field, index_name=f"{field}_idx", index_type="INVERTED")
+            try:
+                self.client.create_index(collection_name=self.collection_name, index_params=scalar_params)
+            except Exception as e:
+                print(f"⚠️ 标量索引 {field} 创建失败，将不使用索引: {e}")
+        self.client.load_collection(self.collection_name)
+
+    def _range_search_params(self, similarity_threshold):
+        """
+        把相似度阈值转换成 Milvus range search 参数，过滤在服务端完成。
+        COSINE / IP 越大越相似，保留 distance > radius 的结果；
+        L2 越小越相似，此时 similarity_threshold 表示允许的最大距离。
+        只设 radius 不设 range_filter：完全相同的向量因浮点误差可能得到 1.0000001 这类分数，
+        设上界会把最相关的结果过滤掉。
+        """
+        params = dict(self.search_params)
+        if similarity_threshold is not None:
+            params["radius"] = similarity_threshold
+        return {"metric_type": self.metric_type, "params": params}
+
+    def _sidecar_path(self, suffix):
+        """与 collection 对应的本地附属文件路径；连接远程 Milvus（URI）时放在当前目录。"""
+        base = os.path.splitext(self.db_path)[0] if "://" not in self.db_path else "."
+        return f"{base}_{self.collection_name}_{suffix}"
+
+    @property
+    def collection_version(self):
+        """数据版本：最近一次写入或删除时的纳秒时间戳，单调递增；没有写入过时为 0。"""
+        try:
+            with open(self._version_path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _bump_version(self):
+        with MilvusStorage._version_lock:
+            previous = self.collection_version
+            version = max(time.time_ns(), previous + 1)
+            tmp_path = f"{self._version_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(version))
+            os.replace(tmp_path, self._version_path)
+        # 本进程的写入已同步更新 BM25 索引；写入前索引就落后（其他进程写过）时保持旧版本，下次检索前重建
+        if self.lexical is not None and self.lexical.version == previous:
+            self.lexical.mark_synced(version)
+
+    def rebuild_lexical_index(self):
+        """从 Milvus 中已有的行重建 BM25 索引（索引文件丢失或首次启用时调用）。"""
+        if self.lexical is None:
+            return 0
+        # 先读版本再查询，查询期间的写入会让版本再次不一致，下次检索前重建
+        version = self.collection_version
+        rows = self.client.query(
+            collection_name=self.collection_name,
+            filter="id >= 0",
+            output_fields=["id", "title", "content", "url", "note_id", "chunk_index"]
+        )
+        self.lexical.clear()
+        self.lexical.add(rows)
+        self.lexical.mark_synced(version)
+        self.lexical.save()
+        return len(rows)
+
+    def _sync_lexical_index(self):
+        """BM25 索引落后于 collection（其他进程写入过）时重建。"""
+        with self._lexical_lock:
+            if self.lexical.version != self.collection_version:
+                n_rows = self.rebuild_lexical_index()
+                print(f"🔄 collection 已被更新，BM25 索引已重建（{n_rows} 行）")
+
+    def flush(self):
+        """把 BM25 索引的改动落盘；批量写入结束后调用。"""
+        if self.lexical is not None:
+            self.lexical.save()
+
+    def note_hash(self, title, content, images):
+        index_config = f"chunk={self.chunk_size}/{self.chunk_overlap}" if self.chunk_size else ""
+        return note_content_hash(title, content, images, index_config)
+
+    def upsert_rows(self, rows):
+        """
+        按笔记整体替换：先按主键 upsert 新行，再删掉这些笔记中不再存在的旧行（如多余的旧片段）。
+        先写后删，替换过程中查询始终能看到这条笔记，中途崩溃也不会丢失笔记。
+        """
+        new_ids = {row["id"] for row in rows}
+        note_ids = sorted({row["note_id"] for row in rows})
+        res = self.client.upsert(collection_name=self.collection_name, data=rows)
+        old_rows = self.client.query(
+            collection_name=self.collection_name,
+            filter=f"id in {note_ids} or note_id in {note_ids}",
+            output_fields=["id"]
+        )
+        stale = [row["id"] for row in old_rows if row["id"] not in new_ids]
+        if stale:
+            self.client.delete(collection_name=self.collection_name, ids=stale)
+        if self.lexical is not None:
+            self.lexical.remove(stale)
+            self.lexical.add(rows)
+        self._bump_version()
+        return res
 
     def close(self):
-        self.client.close()
+        self.flush()
+        if self._owns_client:
+            self.client.close()
+        if self.ocr_cache is not None:
+            self.ocr_cache.close()
+
+    def new_ocr(self):
+        return ParallelOCR(
+            lang='chi_sim+eng',
+            download_workers=self.ocr_download_workers,
+            ocr_workers=self.ocr_workers,
+            image_deadline=self.ocr_image_deadline,
+            cache=self.ocr_cache,
+            preprocess=self.ocr_preprocess,
+        )
+
+    def _get_embeddings(self, texts, batch_size=32):
+        # 保持 float32 的 NumPy 数组，不再转成 Python float 列表
+        with TRACER.span("embed", texts=len(texts)):
+            embeddings = self.model.encode(
+                texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True
+            )
+        return embeddings.astype(np.float32, copy=False)
 
-    def _get_embeddings(self, texts):
-        embeddings = self.model.encode(texts, show_progress_bar=False)
-        return embeddings.tolist()
+    def _cached_ocr(self, img_url, engine, lang, timeout, run):
+        """先查 URL 缓存，再下载后查内容缓存，都未命中才真正执行 run(img_bytes)。"""
+        cache = self.ocr_cache
+        if cache is not None:
+            cached = cache.get_by_url(img_url, engine, lang)
+            if cached is not None:
+                TRACER.incr("cache_hits", cache="ocr")
+                return cached
+        response = get_shared_session().get(img_url, timeout=timeout)
+        img_bytes = response.content
+        if cache is not None:
+            cached = cache.get_by_content(img_url, img_bytes, engine, lang)
+            if cached is not None:
+                TRACER.incr("cache_hits", cache="ocr")
+                return cached
+        with TRACER.span("ocr.image", engine=engine):
+            text = run(img_bytes)
+        if cache is not None:
+            cache.put(img_url, img_bytes, engine, lang, text)
+        return text
 
     def extract_ocr_with_tesseract(self, img_url: str) -> str:
         try:
             # print(f"🔍 Tesseract 提取图片: {img_url}")
-            response = requests.get(img_url, timeout=8)
-            img = Image.open(BytesIO(response.content)).convert("RGB")
-            text = pytesseract.image_to_string(img, lang='chi_sim+eng')
-            return text.strip()
+            # OCR 依赖只在真正入库时才导入，只回答问题的进程不需要加载
+            import pytesseract
+            from PIL import Image
+
+            def run(img_bytes):
+                img = prepare_for_ocr(img_bytes, self.ocr_preprocess.max_side) if self.ocr_preprocess \
+                    else Image.open(BytesIO(img_bytes)).convert("RGB")
+                return pytesseract.image_to_string(img, lang='chi_sim+eng').strip()
+
+            return self._cached_ocr(img_url, "tesseract", 'chi_sim+eng', 8, run)
         except Exception as e:
+            TRACER.incr("ocr_failures", engine="tesseract")
             print(f"❌ Tesseract 提取失败: {img_url}, 错误: {e}")
             return ""
 
     def extract_from_image_with_unstructured(self, img_url):
         try:
-            response = requests.get(img_url, timeout=10)
-            img_bytes = BytesIO(response.content)
-            elements = partition_image(file=img_bytes)
-            text_blocks = [el.text for el in elements if el.text]
-            return "\n".join(text_blocks)
+            from unstructured.partition.image import partition_image
+
+            def run(img_bytes):
+                elements = partition_image(file=BytesIO(img_bytes))
+                text_blocks = [el.text for el in elements if el.text]
+                return "\n".join(text_blocks)
+
+            return self._cached_ocr(img_url, "unstructured", "auto", 10, run)
         except Exception as e:
+            TRACER.incr("ocr_failures", engine="unstructured")
             print(f"❌ 提取失败: {img_url}, 错误: {e}")
             return ""
 
-    def insert_data(self, df):
-        titles = df['title'].tolist()
-        contents = df['content'].tolist()
+    def _build_rows(self, df, ocr, encode_batch_size=32):
+        """对 df 中的笔记做 OCR + 向量化，返回可直接写入 Milvus 的行。"""
+        titles = [_as_text(t) for t in df['title'].tolist()]
+        contents = [_as_text(c) for c in df['content'].tolist()]
         image_lists = df['images'].tolist() if 'images' in df.columns else ["[]"] * len(df)
         links = df['url'].tolist()
 
-        # 提取每条记录的 OCR 文本
-        ocr_texts = []
+        # 提取每条记录的 OCR 文本（下载走线程池，tesseract 走进程池）
+        parsed_lists = []
         for raw in image_lists:
             try:
-                urls = ast.literal_eval(raw) if isinstance(raw, str) else raw
-                ocr_parts = [self.extract_ocr_with_tesseract(url) for url in urls]
-                ocr_text = "\n".join([t for t in ocr_parts if t.strip()])
-                if ocr_text:
-                    print(ocr_text)
-                else:
-                    print("⚠️ 没有提取到 OCR 内容！")
+                parsed_lists.append(parse_image_list(raw))
             except Exception as e:
-                print(f"❌ OCR 提取失败：{e}")
-                ocr_text = ""
-            ocr_texts.append(ocr_text)
+                print(f"❌ 图片列表解析失败：{e}")
+                parsed_lists.append([])
+
+        ocr_texts = ocr.ocr_notes(parsed_lists)
+        for ocr_text in ocr_texts:
+            if ocr_text:
+                print(ocr_text)
+            else:
+                print("⚠️ 没有提取到 OCR 内容！")
 
-        combined_texts = [
-            f"{t} {c} {ocr}".strip()
-            for t, c, ocr in zip(titles, contents, ocr_texts)
+        notes = [
+            {"title": t, "content": c, "url": u, "images": imgs, "ocr_text": ocr_text}
+            for t, c, u, imgs, ocr_text in zip(titles, contents, links, parsed_lists, ocr_texts)
         ]
+        return self.build_rows_from_notes(notes, encode_batch_size)
 
-        embeddings = self._get_embeddings(combined_texts)
+    def build_rows_from_notes(self, notes, encode_batch_size=32):
+        """
+        把已完成 OCR 的笔记向量化成 Milvus 行（分块模式下每条笔记对应多行）。
+        Args:
+            notes: dict 列表，包含 title / content / url / images / ocr_text
+        """
+        items = []
+        for note in notes:
+            note_id = note_id_from_url(note["url"])
+            combined_text = f"{note['title']} {note['content']} {note['ocr_text']}".strip()
+            if self.chunk_size:
+                body = f"{note['content']} {note['ocr_text']}".strip()
+                pieces = split_into_chunks(body, self.chunk_size, self.chunk_overlap) or [""]
+                # 每个片段前面都带上标题，单独检索时也有上下文
+                for k, piece in enumerate(pieces):
+                    items.append((note, note_id, chunk_id(note_id, k), k, piece,
+                                  f"{note['title']} {piece}".strip()))
+            else:
+                items.append((note, note_id, note_id, 0, combined_text, combined_text))
+
+        embeddings = self._get_embeddings([item[5] for item in items], batch_size=encode_batch_size)
 
         data = []
-        for i, emb in enumerate(embeddings):
+        for (note, note_id, row_id, chunk_index, content, _), emb in zip(items, embeddings):
             data.append({
-                "id": i,
+                "id": row_id,
                 "vector": emb,
-                "title": titles[i],
-                "content": combined_texts[i],
-                "url": links[i]
+                "title": _clip_utf8(note["title"], FIELD_MAX_LENGTH["title"]),
+                "content": _clip_utf8(content, FIELD_MAX_LENGTH["content"]),
+                "url": note["url"],
+                "note_id": note_id,
+                "chunk_index": chunk_index,
+                "content_hash": self.note_hash(note["title"], note["content"], note["images"]),
             })
+        return data
 
-        res = self.client.insert(
-            collection_name=self.collection_name,
-            data=data
-        )
-        return res
+    def _write_batches(self, df, batch_size=256, encode_batch_size=32, upsert=False, ocr=None):
+        """
+        分批 OCR、向量化并写入 Milvus，每批写完立刻可查，内存占用只和 batch_size 有关。
+        Args:
+            df: 笔记 DataFrame（title / content / url / images）
+            batch_size: 每批写入 Milvus 的笔记数
+            encode_batch_size: SentenceTransformer.encode 的 batch 大小
+            upsert: True 时用 upsert 写入（增量同步），否则 insert
+            ocr: 调用方已打开的 ParallelOCR，分多次调用时复用同一组线程/进程池和去重状态；
+                 此时由调用方在全部写完后调用一次 finish_ingest(ocr)。为 None 时新建一个，用完关闭
+        Returns:
+            int: 写入的笔记数
+        """
+        # 先按文本长度排序，让同一批次内长度接近，减少 encode 时的 padding
+        # （encode 只在单次调用内部按长度排序）
+        lengths = (df['title'].astype(str).str.len() + df['content'].astype(str).str.len()).to_numpy()
+        df = df.iloc[np.argsort(lengths, kind="stable")]
+
+        written = 0
+        start_time = time.perf_counter()
+        owns_ocr = ocr is None
+        with (self.new_ocr() if owns_ocr else nullcontext(ocr)) as ocr:
+            for start in range(0, len(df), batch_size):
+                batch = df.iloc[start:start + batch_size]
+                data = self._build_rows(batch, ocr, encode_batch_size)
+                if upsert:
+                    self.upsert_rows(data)
+                else:
+                    self.client.insert(collection_name=self.collection_name, data=data)
+                    if self.lexical is not None:
+                        self.lexical.add(data)
+                    self._bump_version()
+                written += len(batch)
+                elapsed = time.perf_counter() - start_time
+                print(f"📥 已写入 {written}/{len(df)} 条笔记，吞吐 {written / elapsed:.2f} notes/s")
+            if owns_ocr:
+                self.finish_ingest(ocr)
+        return written
 
+    def finish_ingest(self, ocr):
+        """一次入库结束后调用一次：BM25 索引落盘，打印 OCR 和 OCR 缓存统计。"""
+        print(f"🖼️ OCR 统计: {ocr.stats}")
+        self.flush()
+        if self.ocr_cache is not None:
+            print(f"📦 OCR 缓存统计: {self.ocr_cache.stats()}")
 
-    def search(self, query_text, top_k=5, similarity_threshold=0.5):
-        query_embedding = self._get_embeddings([query_text])[0]
-        res = self.client.search(
+    def insert_data(self, df, batch_size=256, encode_batch_size=32, ocr=None):
+        written = self._write_batches(df, batch_size=batch_size, encode_batch_size=encode_batch_size, ocr=ocr)
+        return {"insert_count": written}
+
+    def existing_hashes(self, ids):
+        """查询已入库笔记的 content_hash，返回 {note_id: hash}。"""
+        existing = {}
+        for start in range(0, len(ids), 1000):
+            batch = ids[start:start + 1000]
+            rows = self.client.query(
+                collection_name=self.collection_name,
+                filter=f"id in {batch} or note_id in {batch}",
+                output_fields=["id", "note_id", "content_hash"]
+            )
+            for row in rows:
+                existing[row.get("note_id", row["id"])] = row.get("content_hash")
+        return existing
+
+    def delete_missing_notes(self, current_ids):
+        """删除 note_id 不在 current_ids 中的行（笔记已从收藏夹移除），返回删除行数。"""
+        current = set(current_ids)
+        all_rows = self.client.query(
             collection_name=self.collection_name,
-            data=[query_embedding],
-            limit=top_k,
-            output_fields=["title", "content", "url"],
+            filter="id >= 0",
+            output_fields=["id", "note_id"]
         )
-        # 过滤掉相似度低于阈值的结果
-        filtered_results = []
-        for match in res[0]:
-            # Milvus 返回的是距离值，需要转换为相似度分数
-            similarity = match["distance"]  # 将距离转换为相似度
-            if similarity <= similarity_threshold:
-                filtered_results.append(match)
-        return [filtered_results] if filtered_results else [[]]
+        stale = [row["id"] for row in all_rows if row.get("note_id", row["id"]) not in current]
+        if stale:
+            self.client.delete(collection_name=self.collection_name, ids=stale)
+            if self.lexical is not None:
+                self.lexical.remove(stale)
+                self.flush()
+            self._bump_version()
+        return len(stale)
+
+    def sync_data(self, df, delete_missing=False, batch_size=256, encode_batch_size=32, ocr=None):
+        """
+        增量入库：按笔记 URL 生成稳定主键，内容哈希未变的笔记直接跳过，
+        新增或变化的笔记 upsert；delete_missing=True 时删除已不在收藏夹中的笔记。
+        分批调用时 delete_missing 只能在最后用完整的 id 列表调用 delete_missing_notes。
+        Returns:
+            dict: inserted / updated / skipped / deleted 数量
+        """
+        df = df.drop_duplicates(subset=["url"])
+        titles = [_as_text(t) for t in df['title'].tolist()]
+        contents = [_as_text(c) for c in df['content'].tolist()]
+        image_lists = df['images'].tolist() if 'images' in df.columns else ["[]"] * len(df)
+        links = df['url'].tolist()
+
+        ids = [note_id_from_url(url) for url in links]
+        hashes = []
+        for t, c, raw in zip(titles, contents, image_lists):
+            try:
+                images = parse_image_list(raw)
+            except Exception:
+                images = []
+            hashes.append(self.note_hash(t, c, images))
+
+        existing = self.existing_hashes(ids)
+        changed_mask = [existing.get(i) != h for i, h in zip(ids, hashes)]
+        changed = df[changed_mask]
+        n_updated = sum(1 for i, m in zip(ids, changed_mask) if m and i in existing)
+        summary = {
+            "inserted": len(changed) - n_updated,
+            "updated": n_updated,
+            "skipped": len(df) - len(changed),
+            "deleted": 0,
+        }
+
+        if len(changed):
+            self._write_batches(changed, batch_size=batch_size,
+                                encode_batch_size=encode_batch_size, upsert=True, ocr=ocr)
+
+        if delete_missing:
+            summary["deleted"] = self.delete_missing_notes(ids)
+
+        return summary
+
+    def search(self, query_text, top_k=5, similarity_threshold=_DEFAULT_THRESHOLD, mode=None):
+        return self.search_batch([query_text], top_k=top_k, similarity_threshold=similarity_threshold,
+                                 mode=mode)[:1]
+
+    def embed_queries(self, texts):
+        return self._get_embeddings(list(texts))
+
+    def search_batch(self, query_texts, top_k=5, similarity_threshold=_DEFAULT_THRESHOLD, include_vectors=False,
+                     mode=None):
+        """
+        多个查询一次完成：一次 encode 得到所有查询向量，再发一次多向量 search。
+        include_vectors=True 时每条命中的 entity 带上最佳片段的向量（供 MMR 去重使用）。
+        mode: vector / lexical / hybrid，默认用 self.search_mode
+        similarity_threshold: 所有模式含义相同——查询与片段向量的相似度阈值（metric 同 collection），
+            不达标的命中无论来自哪一路都丢弃；None 时不过滤。不传时 vector / hybrid 用
+            DEFAULT_SIMILARITY_THRESHOLD，lexical 不过滤，只查 BM25 索引、不做 encode
+        Returns:
+            list[list[dict]]: 与 query_texts 一一对应的命中列表
+        """
+        mode = mode or self.search_mode
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"unknown search mode: {mode!r}")
+        if similarity_threshold is _DEFAULT_THRESHOLD:
+            similarity_threshold = None if mode == "lexical" else DEFAULT_SIMILARITY_THRESHOLD
+        if mode != "vector":
+            if self.lexical is None:
+                raise ValueError(f"search mode {mode!r} requires lexical_index=True")
+            self._sync_lexical_index()
+        limit = top_k * self.chunk_fanout if self.chunk_size else top_k
+
+        if mode == "lexical":
+            with TRACER.span("lexical.search", queries=len(query_texts)):
+                results = [self.lexical.search(q, limit) for q in query_texts]
+            if similarity_threshold is not None or include_vectors:
+                results = self._filter_lexical_hits(results, self.embed_queries(query_texts),
+                                                    similarity_threshold, include_vectors)
+            return [self._aggregate_chunks(hits, top_k) for hits in results]
+
+        query_embeddings = self.embed_queries(query_texts)
+        output_fields = ["title", "content", "url", "note_id", "chunk_index"]
+        if include_vectors:
+            output_fields.append("vector")
+        # 相似度阈值通过 range search 在 Milvus 内过滤，客户端只收到达标的命中；
+        # similarity_threshold=None 时不过滤
+        with TRACER.span("milvus.search", queries=len(query_texts), limit=limit):
+            res = self.client.search(
+                collection_name=self.collection_name,
+                data=list(query_embeddings),
+                limit=limit,
+                output_fields=output_fields,
+                search_params=self._range_search_params(similarity_threshold),
+            )
+        results = [list(hits) for hits in res]
+
+        if mode == "hybrid":
+            lexical_results = self._filter_lexical_hits(
+                [self.lexical.search(q, limit) for q in query_texts], query_embeddings,
+                similarity_threshold, include_vectors
+            )
+            results = [self._fuse_hits(hits, lexical_hits, limit)
+                       for hits, lexical_hits in zip(results, lexical_results)]
+        return [self._aggregate_chunks(hits, top_k) for hits in results]
+
+    def _filter_lexical_hits(self, results, query_embeddings, similarity_threshold, include_vectors):
+        """
+        对 BM25 命中应用与向量检索相同的相似度阈值：一次 query 取回命中行的向量，
+        在客户端按 collection 的 metric 计算与查询向量的相似度；include_vectors=True 时顺带写入向量。
+        """
+        ids = sorted({match["id"] for hits in results for match in hits})
+        if not ids:
+            return results
+        rows = self.client.query(collection_name=self.collection_name, filter=f"id in {ids}",
+                                 output_fields=["id", "vector"])
+        vectors = {row["id"]: np.asarray(row["vector"], dtype=np.float32) for row in rows}
+
+        filtered = []
+        for hits, query_vec in zip(results, query_embeddings):
+            kept = []
+            for match in hits:
+                vec = vectors.get(match["id"])
+                if vec is None:
+                    continue  # 索引中有、collection 中已删除的行
+                if similarity_threshold is not None:
+                    if self.metric_type == "L2":
+                        passed = float(np.linalg.norm(vec - query_vec)) <= similarity_threshold
+                    elif self.metric_type == "COSINE":
+                        denom = float(np.linalg.norm(vec) * np.linalg.norm(query_vec)) or 1.0
+                        passed = float(vec @ query_vec) / denom >= similarity_threshold
+                    else:
+                        passed = float(vec @ query_vec) >= similarity_threshold
+                    if not passed:
+                        continue
+                if include_vectors:
+                    match = {**match, "entity": {**match["entity"], "vector": vec}}
+                kept.append(match)
+            filtered.append(kept)
+        return filtered
+
+    def _fuse_hits(self, vector_hits, lexical_hits, limit):
+        """按行 reciprocal-rank fusion 合并向量和 BM25 两路命中，distance 字段替换为融合分数。"""
+        scores = {}
+        matches = {}
+        for hits in (vector_hits, lexical_hits):
+            for rank, match in enumerate(hits):
+                scores[match["id"]] = scores.get(match["id"], 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                matches.setdefault(match["id"], match)
+        fused = []
+        for row_id in sorted(scores, key=scores.get, reverse=True)[:limit]:
+            fused.append({**matches[row_id], "distance": scores[row_id]})
+        return fused
+
+    @staticmethod
+    def _aggregate_chunks(hits, top_k):
+        """
+        把片段命中按笔记聚合：笔记按其最佳片段的名次排序，最多 top_k 条；
+        content 只保留命中的片段（按原文顺序），而不是整条笔记。
+        """
+        notes = {}
+        for match in hits:
+            entity = match["entity"]
+            note_id = entity.get("note_id", match["id"])
+            if note_id not in notes:
+                if len(notes) >= top_k:
+                    continue
+                notes[note_id] = {
+                    "id": note_id,
+                    "distance": match["distance"],
+                    "entity": {"title": entity["title"], "url": entity["url"]},
+                    "chunks": [],
+                }
+                if "vector" in entity:
+                    notes[note_id]["entity"]["vector"] = entity["vector"]
+            notes[note_id]["chunks"].append((entity.get("chunk_index", 0), entity["content"]))
+
+        aggregated = []
+        for note in notes.values():
+            chunks = sorted(note.pop("chunks"))
+            note["entity"]["content"] = "\n...\n".join(text for _, text in chunks)
+            aggregated.append(note)
+        return aggregated
 
     def query(self, filter_str):
         res = self.client.query(
@@ -124,9 +686,21 @@ class MilvusStorage:
         )
         return res
 
-    def delete(self, filter_str):
-        res = self.client.delete(
-            collection_name=self.collection_name,
-            filter=filter_str
-        )
+    def delete(self, filter_str=None, ids=None):
+        if ids is None and self.lexical is not None:
+            # 过滤条件无法在 BM25 索引上执行，先查出命中的主键，再按主键删除
+            rows = self.client.query(collection_name=self.collection_name, filter=filter_str,
+                                     output_fields=["id"])
+            ids = [row["id"] for row in rows]
+        if ids is not None:
+            res = self.client.delete(collection_name=self.collection_name, ids=ids)
+            if self.lexical is not None:
+                self.lexical.remove(ids)
+                self.flush()
+        else:
+            res = self.client.delete(
+                collection_name=self.collection_name,
+                filter=filter_str
+            )
+        self._bump_version()
         return res
@@ -1,12 +1,17 @@
 from langchain_google_vertexai import ChatVertexAI
 from typing import Dict, List
 import os
+import re
 
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "./my-gemini-key.json"
 
+# Matches "1. Relevance: 4/5", "**Accuracy:** [4.5]/5", "Fluency: 3 / 5", ...
+SCORE_RE = re.compile(r"^\s*(?:\d+\.\s*)?([A-Za-z][A-Za-z ]*?)\s*:\s*\[?\s*(\d+(?:\.\d+)?)\s*\]?\s*/\s*5\b")
+
 class ResponseEvaluator:
-    def __init__(self, model_name: str = "gemini-1.5-pro"):
-        self.llm = ChatVertexAI(model_name=model_name, temperature=0.0)
+    def __init__(self, model_name: str = "gemini-1.5-pro", llm=None):
+        # Pass a stub llm to evaluate offline
+        self.llm = llm if llm is not None else ChatVertexAI(model_name=model_name, temperature=0.0)
         
     def evaluate(self, query: str, response: Dict, sources: List[Dict]) -> Dict:
         """
@@ -20,7 +25,16 @@ class ResponseEvaluator:
         Returns:
             Evaluation results with scores and detailed feedback
         """
-        evaluation_prompt = f"""
+        evaluation = self.llm.invoke(self.build_prompt(query, response, sources))
+        return self._parse_evaluation(evaluation.content)
+
+    async def aevaluate(self, query: str, response: Dict, sources: List[Dict]) -> Dict:
+        """Async version of evaluate, used by the batch evaluation harness"""
+        evaluation = await self.llm.ainvoke(self.build_prompt(query, response, sources))
+        return self._parse_evaluation(evaluation.content)
+
+    def build_prompt(self, query: str, response: Dict, sources: List[Dict]) -> str:
+        return f"""
         Please evaluate the quality of the following RAG system response. Rate each dimension (1-5) and provide detailed feedback:
 
         1. Relevance: How well does the answer address the question?
@@ -54,9 +68,6 @@ class ResponseEvaluator:
 
         Overall Assessment: [summary feedback]
         """
-        
-        evaluation = self.llm.invoke(evaluation_prompt)
-        return self._parse_evaluation(evaluation.content)
     
     def _format_sources(self, sources: List[Dict]) -> str:
         """Format source documents"""
@@ -79,14 +90,10 @@ class ResponseEvaluator:
         """Extract scores from evaluation text"""
         scores = {}
         for line in text.split('\n'):
-            if ':' in line and '/5' in line:
-                metric, score = line.split(':')
-                metric = metric.strip()
-                score = score.strip().split('/')[0].strip()
-                try:
-                    scores[metric] = float(score)
-                except ValueError:
-                    continue
+            # Strip markdown bold; extra colons in the feedback no longer break parsing
+            match = SCORE_RE.match(line.replace('*', ''))
+            if match:
+                scores[match.group(1).strip()] = float(match.group(2))
         return scores
 
 def main():
@@ -1,76 +1,134 @@
+import asyncio
 import os
 import json
-from pathlib import Path
+import logging
+import threading
 
-import gradio as gr
-from vertexai import init
+from startup_profile import STARTUP
 
-from rag_pipeline import RAGPipeline
-from crawl_xiaohongshu_board import crawl_xiaohongshu_board
-from embedding_database import MilvusStorage
+with STARTUP.phase("import gradio"):
+    import gradio as gr
+
+from embedding_backends import embedding_backend_from_env
+from resources import ResourceRegistry
+from tracing import TRACER
+
+# 爬虫（playwright）、OCR 和入库相关的模块只在 ensure_vectors_loaded 里按需导入，
+# torch / pymilvus / Vertex SDK 由 REGISTRY 在后台线程加载
 
 # ---------- Vertex AI credential & init ----------
 KEY_PATH = "./my-gemini-key.json"
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = KEY_PATH
 
-with open(KEY_PATH, "r") as f:
-    PROJECT_ID = json.load(f)["project_id"]
+def init_vertex():
+    from vertexai import init
+
+    with open(KEY_PATH, "r") as f:
+        project_id = json.load(f)["project_id"]
 
-# 根据你的区域调整
-init(project=PROJECT_ID, location="us-central1")
+    # 根据你的区域调整
+    init(project=project_id, location="us-central1")
 
 # ---------- Milvus / Collection settings ----------
 COLLECTION_NAME = "xiaohongshu_content"
 DB_PATH = "./milvus_demo.db"
-FLAG_PATH = Path(".xhs_loaded.flag")   # 抓取完成的标志文件
 
-# ---------- Helper : ensure vectors only loaded once ----------
+# 进程级共享资源：模型、Milvus 客户端和 RAGPipeline 只加载一次
+REGISTRY = ResourceRegistry(
+    collection_name=COLLECTION_NAME,
+    db_path=DB_PATH,
+    # 分块索引，只把命中的片段放进 prompt；hybrid 检索让地名、商品名等精确词也能命中
+    storage_kwargs={"chunk_size": 100, "chunk_overlap": 20, "search_mode": "hybrid"},
+    # embedding 后端由环境变量 EMBEDDING_BACKEND（torch / onnx / int8）等控制
+    embedding_kwargs=embedding_backend_from_env(),
+    setup=init_vertex,
+    top_k=3,
+    temperature=0.7,
+    model_name="gemini-1.5-pro"
+)
+
+# 本进程内已经同步过的收藏夹，避免每条消息都重新抓取。
+# 已同步的收藏夹不加锁直接返回；每个收藏夹一把锁，同一收藏夹的并发消息只抓取一次；
+# 浏览器用户目录同时只能被一个持久化上下文打开，真正的抓取再用 _CRAWL_LOCK 串行
+_SYNCED_BOARDS = set()
+_BOARD_LOCKS = {}
+_BOARD_LOCKS_GUARD = threading.Lock()
+_CRAWL_LOCK = threading.Lock()
+
+def _board_lock(favorite_url: str) -> threading.Lock:
+    with _BOARD_LOCKS_GUARD:
+        return _BOARD_LOCKS.setdefault(favorite_url, threading.Lock())
+
+# ---------- Helper : diff-based refresh of the vector store ----------
 def ensure_vectors_loaded(favorite_url: str):
-    """If flag exists, skip crawling. Otherwise crawl + insert + create flag."""
-    if FLAG_PATH.exists():
-        return  # 已抓取过
-
-    # --- 抓取小红书收藏夹 ---
-    df = crawl_xiaohongshu_board(favorite_url)
-
-    # --- 写入向量数据库 ---
-    storage = MilvusStorage(collection_name=COLLECTION_NAME, db_path=DB_PATH)
-    storage.insert_data(df)
-
-    # --- 创建 flag 文件 ---
-    FLAG_PATH.touch()
+    """Crawl the board once per process and sync it incrementally: unchanged notes are skipped,
+    changed ones are upserted, and notes removed from the board are deleted."""
+    if favorite_url in _SYNCED_BOARDS:
+        return
+    with _board_lock(favorite_url), _CRAWL_LOCK:
+        if favorite_url in _SYNCED_BOARDS:
+            return
+
+        from board_store import BoardWriter, board_file_for
+        from crawl_xiaohongshu_board import iter_xiaohongshu_board
+        from streaming_pipeline import StreamingIngestPipeline
+
+        # --- 边抓取边增量写入向量数据库，同时把笔记保存为 JSONL 收藏夹文件（initialize_milvus 可直接读取）；
+        #     每个收藏夹一个文件，同步一个收藏夹不会覆盖另一个的文件 ---
+        ingest = StreamingIngestPipeline(REGISTRY.storage(), skip_unchanged=True, delete_missing=True,
+                                         sinks=[BoardWriter(board_file_for(favorite_url))])
+        summary = ingest.run(iter_xiaohongshu_board(favorite_url, on_links=ingest.set_board_links))
+        if summary["indexed"] or summary["deleted"]:
+            REGISTRY.rebuild_pipeline()
+
+        _SYNCED_BOARDS.add(favorite_url)
 
 # ---------- RAG 推理 ----------
 def answer_query(query: str):
-    pipeline = RAGPipeline(
-        collection_name=COLLECTION_NAME,
-        db_path=DB_PATH,
-        top_k=3,
-        temperature=0.7,
-        model_name="gemini-1.5-pro"
-    )
-    return pipeline.answer(query)
-
-# ---------- ChatInterface 回调 ----------
-def rag_chat(user_message: str, history: list[tuple[str, str]], favorite_url: str):
-    if not favorite_url.strip():
-        return "Please paste the bookmark link on the left first, then ask questions."
+    return REGISTRY.pipeline().answer(query)
 
-    # 确保向量已加载（首次会抓取并写入）
-    ensure_vectors_loaded(favorite_url)
+def stream_query(query: str):
+    return REGISTRY.pipeline().stream_answer(query)
 
-    # 生成回答
-    response = answer_query(user_message)
+async def astream_query(query: str):
+    # 首次调用可能要等后台预热（模型、Milvus）完成，放到线程池里取 pipeline，不阻塞事件循环
+    pipeline = await asyncio.to_thread(REGISTRY.pipeline)
+    async for event in pipeline.astream_answer(query):
+        yield event
 
+def render_response(user_message: str, answer_text: str, sources: list) -> str:
     answer = f"Question: {user_message}\n\n"
-    answer += f"Answer: {response['answer']}\n\n"
+    answer += f"Answer: {answer_text}\n\n"
     answer += "Source Document:\n"
-    for i, src in enumerate(response["sources"], 1):
+    for i, src in enumerate(sources, 1):
         answer += f"\n--- Source {i} ---\n"
         answer += f"Title: {src['title']}\n"
         answer += f"URL: {src['url']}...\n"
     return answer
 
+# ---------- ChatInterface 回调（异步生成器，边生成边渲染，等待 LLM 时不占用工作线程） ----------
+async def rag_chat(user_message: str, history: list[tuple[str, str]], favorite_url: str):
+    if not favorite_url.strip():
+        yield "Please paste the bookmark link on the left first, then ask questions."
+        return
+
+    # 确保向量已加载（首次会抓取并写入）；抓取是阻塞的，放到线程池执行，已同步过的收藏夹不占用线程
+    if favorite_url not in _SYNCED_BOARDS:
+        await asyncio.to_thread(ensure_vectors_loaded, favorite_url)
+
+    # 流式生成回答：检索完成后先展示来源，再逐 token 追加答案
+    sources = []
+    answer_text = ""
+    async for event in astream_query(user_message):
+        if event["type"] == "sources":
+            sources = event["sources"]
+        elif event["type"] == "token":
+            answer_text += event["text"]
+        elif event["type"] == "done":
+            print(f"⏱️ TTFT {event['ttft_seconds']:.2f}s，总耗时 {event['total_seconds']:.2f}s")
+            continue
+        yield render_response(user_message, answer_text, sources)
+
 # ---------- Gradio UI ----------
 with gr.Blocks(title="Bookmark Assistant Bot Demo") as demo:
     gr.Markdown(
@@ -95,4 +153,13 @@ with gr.Blocks(title="Bookmark Assistant Bot Demo") as demo:
 
 # ---------- Start ----------
 if __name__ == "__main__":
+    # 模型、Milvus 客户端和 Vertex 在后台加载，界面先启动接受连接；加载完成后打印各阶段耗时
+    REGISTRY.warm_in_background()
+    # TRACING=1 时输出各阶段的结构化日志，并在旁边的端口提供 Prometheus /metrics
+    if TRACER.enabled:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        TRACER.start_metrics_server(port=int(os.environ.get("METRICS_PORT", "9464")))
+    # 回调是异步的，放开 Gradio 默认每个事件 1 个并发的限制
+    demo.queue(default_concurrency_limit=64)
+    STARTUP.mark("ui launching")
     demo.launch(share=False)
\ No newline at end of file
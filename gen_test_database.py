@@ -20,7 +20,7 @@ if __name__ == "__main__":
     '''
     
     # 创建 MilvusStorage 实例
-    storage = MilvusStorage(collection_name="xiaohongshu_content", db_path="./milvus_demo.db")
+    storage = MilvusStorage(collection_name="xiaohongshu_content", db_path="./milvus_demo.db", lexical_index=True)
     
     
     # 搜索示例：查找与查询文本最相似的记录
@@ -30,6 +30,10 @@ if __name__ == "__main__":
     res_search = storage.search("hangzhou", top_k=3, similarity_threshold=0.2)
     print("搜索结果：", res_search)
 
+    # 关键词检索：只查本地 BM25 索引，不设相似度阈值时不需要 encode
+    res_search = storage.search("hangzhou", top_k=3, similarity_threshold=None, mode="lexical")
+    print("关键词搜索结果：", res_search)
+
     
     # 查询示例：根据过滤条件查询（例如，根据标题关键词）
     res_query = storage.query("title like '%rice%'")
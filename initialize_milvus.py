@@ -1,6 +1,6 @@
 # initialize_milvus.py
-from embedding_database import MilvusStorage
-import pandas as pd
+from board_store import find_board_file, iter_board_batches
+from embedding_database import MilvusStorage, note_id_from_url
 
 # 清空 collection 中所有数据的正确方式
 def delete_all_from_collection(storage):
@@ -13,29 +13,54 @@ def delete_all_from_collection(storage):
     all_ids = [doc["id"] for doc in all_data]
 
     if all_ids:
-        storage.client.delete(
-            collection_name=storage.collection_name,
-            ids=all_ids  # 传入主键列表删除
-        )
+        storage.delete(ids=all_ids)  # 传入主键列表删除
         print(f"🗑️ 已删除原有 {len(all_ids)} 条记录")
     else:
         print("⚠️ 集合中无数据，无需删除")
 
-def initialize(overwrite=True):
+def initialize(overwrite=True, incremental=False, board_path=None, batch_size=256):
+    """
+    把爬下来的收藏夹写入 Milvus。
+    board_path: 收藏夹文件（.jsonl / .parquet，兼容旧的 .xlsx），默认按 jsonl → parquet → xlsx 查找
+    batch_size: 每次从文件读取并写入的笔记数，整个收藏夹不会一次性读进内存
+    """
     # 读取你爬下来的收藏夹内容
-    excel_path = "./xiaohongshu_board.xlsx"
-    df = pd.read_excel(excel_path)
+    board_path = find_board_file("./xiaohongshu_board", board_path)
+    print(f"📄 读取收藏夹文件 {board_path}")
 
     # 初始化 Milvus 向量数据库
     storage = MilvusStorage(collection_name="xiaohongshu_content", db_path="./milvus_demo.db")
 
+    if incremental:
+        # 增量模式：只处理新增/变化的笔记，overwrite 时顺带删除已不在收藏夹中的笔记
+        summary = {"inserted": 0, "updated": 0, "skipped": 0, "deleted": 0}
+        current_ids = []
+        with storage.new_ocr() as ocr:
+            for df in iter_board_batches(board_path, batch_size=batch_size):
+                current_ids.extend(note_id_from_url(url) for url in df['url'])
+                batch_summary = storage.sync_data(df, batch_size=batch_size, ocr=ocr)
+                for key in ("inserted", "updated", "skipped"):
+                    summary[key] += batch_summary[key]
+            storage.finish_ingest(ocr)
+        # 删除需要完整的 id 列表，只能在读完整个文件后进行
+        if overwrite:
+            summary["deleted"] = storage.delete_missing_notes(current_ids)
+        print(f"✅ 增量同步完成：新增 {summary['inserted']}，更新 {summary['updated']}，"
+              f"跳过 {summary['skipped']}，删除 {summary['deleted']}")
+        return
+
     if overwrite:
         print("⚠️ 正在清空已有数据（覆盖模式）...")
         delete_all_from_collection(storage)
 
-    # 插入数据
-    res = storage.insert_data(df)
-    print(f"✅ 成功将 {len(df)} 条笔记插入到 Milvus 中！")
+    # 插入数据：按批读取、按批写入，共用一组 OCR 线程/进程池
+    total = 0
+    with storage.new_ocr() as ocr:
+        for df in iter_board_batches(board_path, batch_size=batch_size):
+            res = storage.insert_data(df, batch_size=batch_size, ocr=ocr)
+            total += res["insert_count"]
+        storage.finish_ingest(ocr)
+    print(f"✅ 成功将 {total} 条笔记插入到 Milvus 中！")
 
 if __name__ == "__main__":
     initialize()
@@ -0,0 +1,165 @@
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+
+_CJK = "\u3400-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[a-z0-9]+")
+_CJK_RUN_RE = re.compile(rf"[{_CJK}]+")
+
+
+def tokenize(text: str):
+    """
+    拉丁文按单词切分并转小写；中文没有空格，连续的 CJK 字符切成单字 + 相邻二字，
+    不依赖分词词典也能匹配 "杭州"、"螺蛳粉" 这类专有名词。
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall((text or "").lower()):
+        if _CJK_RUN_RE.fullmatch(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    本地 BM25 倒排索引，与 Milvus collection 中的行一一对应（主键相同）。
+    纯 Python 实现，检索不需要模型推理；持久化为 pickle 文件，写入后调用 save() 落盘。
+    """
+
+    def __init__(self, path=None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._docs = {}       # row id -> {"note_id", "title", "content", "url", "chunk_index", "length"}
+        self._postings = {}   # term -> {row id: tf}
+        self._total_length = 0
+        # 索引对应的 collection 版本（MilvusStorage.collection_version），不一致时需要重建
+        self.version = 0
+        self._dirty = False
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        self._docs = state["docs"]
+        self._postings = state["postings"]
+        self.version = state.get("version", 0)
+        self._total_length = sum(doc["length"] for doc in self._docs.values())
+
+    def save(self):
+        """有改动时原子地写回磁盘（先写临时文件再替换）。"""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"docs": self._docs, "postings": self._postings, "version": self.version}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def add(self, rows):
+        """
+        写入（或覆盖）Milvus 行，rows 与 client.insert 的数据相同，只用到文本字段。
+        """
+        with self._lock:
+            for row in rows:
+                row_id = row["id"]
+                self._remove_one(row_id)
+                tf = Counter(tokenize(f"{row.get('title', '')} {row.get('content', '')}"))
+                length = sum(tf.values())
+                self._docs[row_id] = {
+                    "note_id": row.get("note_id", row_id),
+                    "title": row.get("title", ""),
+                    "content": row.get("content", ""),
+                    "url": row.get("url", ""),
+                    "chunk_index": row.get("chunk_index", 0),
+                    "length": length,
+                    "terms": tuple(tf),
+                }
+                self._total_length += length
+                for term, count in tf.items():
+                    self._postings.setdefault(term, {})[row_id] = count
+            self._dirty = True
+
+    def _remove_one(self, row_id):
+        doc = self._docs.pop(row_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc["length"]
+        for term in doc["terms"]:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(row_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def remove(self, ids):
+        """按主键删除行。"""
+        with self._lock:
+            for row_id in ids:
+                self._remove_one(row_id)
+            self._dirty = True
+
+    def remove_notes(self, note_ids):
+        """删除这些笔记的所有行（主键或 note_id 在 note_ids 中）。"""
+        note_ids = set(note_ids)
+        with self._lock:
+            stale = [row_id for row_id, doc in self._docs.items()
+                     if row_id in note_ids or doc["note_id"] in note_ids]
+            self.remove(stale)
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._postings.clear()
+            self._total_length = 0
+            self._dirty = True
+
+    def mark_synced(self, version):
+        """记录索引已与该版本的 collection 一致。"""
+        with self._lock:
+            self.version = version
+            self._dirty = True
+
+    def search(self, query: str, limit: int = 10):
+        """
+        BM25 打分，返回与 MilvusClient.search 单个查询结果相同结构的命中列表，
+        distance 字段为 BM25 分数（越大越相关）。
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs or not terms:
+                return []
+            avg_length = self._total_length / n_docs
+            scores = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for row_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._docs[row_id]["length"] / avg_length)
+                    scores[row_id] = scores.get(row_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            best = sorted(scores, key=scores.get, reverse=True)[:limit]
+            hits = []
+            for row_id in best:
+                doc = self._docs[row_id]
+                hits.append({
+                    "id": row_id,
+                    "distance": scores[row_id],
+                    "entity": {key: doc[key] for key in ("title", "content", "url", "note_id", "chunk_index")},
+                })
+            return hits
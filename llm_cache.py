@@ -0,0 +1,65 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+
+def prompt_key(prompt: str, llm_string: str) -> str:
+    """prompt 和模型配置（llm_string 包含模型名、温度等）一起做哈希，换模型或参数不会误命中。"""
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+class PromptHashCache(BaseCache):
+    """
+    LangChain LLM 缓存的 sqlite 实现，以 prompt 哈希为键。
+    通过 langchain_core.globals.set_llm_cache 启用后，所有 LLM 调用（查询改写、生成、评测）
+    遇到相同 prompt 直接返回磁盘上的结果，重复评测只为变化的部分付费。
+    """
+
+    def __init__(self, path: str = "./llm_cache.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_results (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_results WHERE key = ?", (prompt_key(prompt, llm_string),)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value = dumps(list(return_val))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_results (key, value) VALUES (?, ?)",
+                (prompt_key(prompt, llm_string), value),
+            )
+            self._conn.commit()
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_results")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,156 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def normalize_image_url(url: str) -> str:
+    """与爬虫 JS 里的 clean_url 保持一致：去掉 ? 之后的参数和 | 之后的样式后缀。"""
+    return url.split('?')[0].split('|')[0]
+
+
+# 跳过结果与 OCR 文本存在同一张表里：engine 列为 SKIP_ENGINE，lang 列存前处理阈值，text 列存跳过原因
+SKIP_ENGINE = "skip"
+
+
+def content_key(img_bytes: bytes) -> str:
+    return "sha256:" + hashlib.sha256(img_bytes).hexdigest()
+
+
+def url_key(url: str) -> str:
+    return "url:" + normalize_image_url(url)
+
+
+class OCRCache:
+    """
+    本地持久化的 OCR 结果缓存（sqlite）。
+    以规范化后的图片 URL 为主键，图片内容的 sha256 作为兜底键；
+    同时记录 OCR 引擎和语言，超过容量上限时按最近访问时间（LRU）淘汰。
+    前处理跳过的图片也按 URL 记录跳过原因，下次不用再下载判断。
+    """
+
+    def __init__(self, path: str = "./ocr_cache.db", max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                key TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (key, engine, lang)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ocr_last_access ON ocr_results(last_access)"
+        )
+        self._conn.commit()
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM ocr_results"
+        ).fetchone()[0]
+
+        self.url_hits = 0
+        self.content_hits = 0
+        self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, key: str, engine: str, lang: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM ocr_results WHERE key = ? AND engine = ? AND lang = ?",
+                (key, engine, lang),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE ocr_results SET last_access = ? WHERE key = ? AND engine = ? AND lang = ?",
+                (time.time(), key, engine, lang),
+            )
+            self._conn.commit()
+            return row[0]
+
+    def _put(self, key: str, engine: str, lang: str, text: str):
+        size = len(key.encode("utf-8")) + len(text.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM ocr_results WHERE key = ? AND engine = ? AND lang = ?",
+                (key, engine, lang),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, engine, lang, text, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, engine, lang, text, size, time.time()),
+            )
+            self._total += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # 调用方已持有锁
+        while self._total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, engine, lang, size FROM ocr_results ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total = 0
+                break
+            for key, engine, lang, size in rows:
+                self._conn.execute(
+                    "DELETE FROM ocr_results WHERE key = ? AND engine = ? AND lang = ?",
+                    (key, engine, lang),
+                )
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    break
+
+    def get_by_url(self, url: str, engine: str, lang: str) -> Optional[str]:
+        text = self._get(url_key(url), engine, lang)
+        if text is not None:
+            self.url_hits += 1
+        return text
+
+    def get_by_content(self, url: str, img_bytes: bytes, engine: str, lang: str) -> Optional[str]:
+        """按图片内容查找；命中后补写 URL 键，下次无需再下载。"""
+        text = self._get(content_key(img_bytes), engine, lang)
+        if text is None:
+            self.misses += 1
+            return None
+        self.content_hits += 1
+        self._put(url_key(url), engine, lang, text)
+        return text
+
+    def put(self, url: str, img_bytes: Optional[bytes], engine: str, lang: str, text: str):
+        self._put(url_key(url), engine, lang, text)
+        if img_bytes is not None:
+            self._put(content_key(img_bytes), engine, lang, text)
+
+    def get_skip(self, url: str, skip_key: str) -> Optional[str]:
+        """前处理判定为不需要 OCR 的图片，返回当时的跳过原因；skip_key 随前处理阈值变化。"""
+        reason = self._get(url_key(url), SKIP_ENGINE, skip_key)
+        if reason is not None:
+            self.url_hits += 1
+        return reason
+
+    def put_skip(self, url: str, skip_key: str, reason: str):
+        self._put(url_key(url), SKIP_ENGINE, skip_key, reason)
+
+    def stats(self) -> dict:
+        lookups = self.url_hits + self.content_hits + self.misses
+        hits = self.url_hits + self.content_hits
+        return {
+            "url_hits": self.url_hits,
+            "content_hits": self.content_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "size_bytes": self._total,
+        }
@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from io import BytesIO
+from typing import List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ocr_cache import content_key
+from ocr_preprocess import PreprocessConfig, analyze_image, prepare_for_ocr
+from tracing import TRACER
+
+try:
+    import resource  # 仅 Unix 可用
+except ImportError:
+    resource = None
+
+
+_session_lock = threading.Lock()
+_shared_session = None
+
+
+def get_shared_session(pool_size: int = 16) -> requests.Session:
+    """进程内共享的 HTTP Session（keep-alive 连接池），避免每张图都重新建连。"""
+    global _shared_session
+    with _session_lock:
+        if _shared_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _shared_session = session
+        return _shared_session
+
+
+def download_image(url: str, timeout: float = 8, session: Optional[requests.Session] = None) -> bytes:
+    session = session or get_shared_session()
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+def ocr_image_bytes(img_bytes: bytes, lang: str = "chi_sim+eng", timeout: float = 0,
+                    max_side: Optional[int] = None) -> str:
+    """
+    对图片字节做 tesseract OCR。放在模块顶层，才能被进程池 pickle。
+    max_side 不为 None 时先转灰度并缩小到最长边 max_side 以内。
+    """
+    import pytesseract
+    from PIL import Image
+
+    if max_side is not None:
+        img = prepare_for_ocr(img_bytes, max_side)
+    else:
+        img = Image.open(BytesIO(img_bytes)).convert("RGB")
+    text = pytesseract.image_to_string(img, lang=lang, timeout=timeout)
+    return text.strip()
+
+
+def _children_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _ocr_worker(img_bytes: bytes, lang: str, timeout: float, max_side: Optional[int],
+                in_process_pool: bool = True):
+    """
+    OCR 任务：返回 (文本, 消耗的 CPU 秒数, 识别耗时秒数)。耗时在 worker 内计时，不包含排队时间。
+    进程池中每个 worker 同时只跑一个任务，RUSAGE_CHILDREN 的增量就是这次 tesseract 子进程的 CPU；
+    线程池模式下子进程统计是整个进程共享的，改用本线程的 CPU 时间（不含 tesseract 子进程）。
+    Windows 没有 resource 模块，同样退化为线程 CPU 时间。
+    """
+    start = time.perf_counter()
+    use_children = in_process_pool and resource is not None
+    cpu_before = _children_cpu_seconds() if use_children else time.thread_time()
+    text = ocr_image_bytes(img_bytes, lang, timeout, max_side)
+    cpu_after = _children_cpu_seconds() if use_children else time.thread_time()
+    return text, cpu_after - cpu_before, time.perf_counter() - start
+
+
+def parse_image_list(raw) -> List[str]:
+    """Excel 读回来的 images 列是字符串形式的 list，这里统一转回 list。"""
+    import ast
+
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        raw = raw.strip()
+        if not raw:
+            return []
+        raw = ast.literal_eval(raw)
+    return [url for url in raw if isinstance(url, str) and url]
+
+
+class ParallelOCR:
+    """
+    并发 OCR：线程池负责下载图片（共享 Session），进程池负责 tesseract 识别。
+    每张图片有独立的截止时间，结果按原始顺序重新拼回每条笔记。
+    """
+
+    def __init__(
+        self,
+        lang: str = "chi_sim+eng",
+        download_workers: int = 16,
+        ocr_workers: Optional[int] = None,
+        download_timeout: float = 8,
+        image_deadline: float = 30,
+        use_processes: bool = True,
+        session: Optional[requests.Session] = None,
+        cache=None,
+        preprocess: Optional[PreprocessConfig] = PreprocessConfig(),
+    ):
+        self.lang = lang
+        self.download_workers = download_workers
+        self.ocr_workers = ocr_workers or os.cpu_count() or 1
+        self.download_timeout = download_timeout
+        self.image_deadline = image_deadline
+        self.use_processes = use_processes
+        self.session = session or get_shared_session(pool_size=download_workers)
+        # 可选的 OCRCache，命中时跳过下载或识别
+        self.cache = cache
+        # OCR 前处理：缩小 + 灰度、跳过小图和不像有文字的图、相同内容去重；None 时原图直接识别
+        self.preprocess = preprocess
+        self._seen_content = {}  # content_key -> Future[text]，本实例识别过的所有图片
+        self._seen_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # skipped_* 的后缀与 ocr_preprocess.analyze_image 的 skip_reason 一致
+        self.stats = {"ocr": 0, "cache_hits": 0, "skipped_too_small": 0, "skipped_low_text": 0,
+                      "deduped": 0, "failed": 0, "ocr_cpu_seconds": 0.0}
+
+        self._download_pool = None
+        self._ocr_pool = None
+        self._pool_lock = threading.Lock()
+
+    def _pools(self):
+        # 流式入库时多个线程会同时调用 ocr_urls，池的创建需要加锁
+        with self._pool_lock:
+            return self._create_pools()
+
+    def _create_pools(self):
+        if self._download_pool is None:
+            self._download_pool = ThreadPoolExecutor(
+                max_workers=self.download_workers, thread_name_prefix="ocr-download"
+            )
+        if self._ocr_pool is None:
+            if self.use_processes:
+                self._ocr_pool = ProcessPoolExecutor(max_workers=self.ocr_workers)
+            else:
+                self._ocr_pool = ThreadPoolExecutor(
+                    max_workers=self.ocr_workers, thread_name_prefix="ocr-tesseract"
+                )
+        return self._download_pool, self._ocr_pool
+
+    def close(self):
+        if self._download_pool is not None:
+            self._download_pool.shutdown(wait=True, cancel_futures=True)
+            self._download_pool = None
+        if self._ocr_pool is not None:
+            self._ocr_pool.shutdown(wait=True, cancel_futures=True)
+            self._ocr_pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def _claim_duplicate(self, key: str):
+        """
+        查找内容完全相同的已处理图片：找到时返回它的 Future（复用其 OCR 结果），
+        否则登记一个新的 Future 并返回 (None, 新 Future)，由调用方负责写入结果。
+        """
+        with self._seen_lock:
+            future = self._seen_content.get(key)
+            if future is not None:
+                return future, None
+            future = self._seen_content[key] = Future()
+            return None, future
+
+    def _process_one(self, url: str) -> str:
+        try:
+            text, outcome, cpu_seconds = self._ocr_one(url)
+        except Exception as e:
+            TRACER.incr("ocr_failures", engine="tesseract")
+            self._count("failed")
+            print(f"❌ Tesseract 提取失败: {url}, 错误: {e}")
+            return ""
+        # 统计放在 try 之外，计数本身出错不会被当成 OCR 失败吞掉
+        self._count(outcome)
+        if cpu_seconds:
+            self._count("ocr_cpu_seconds", cpu_seconds)
+        return text
+
+    def _ocr_one(self, url: str):
+        """返回 (文本, 计入 stats 的结果类型, tesseract CPU 秒数)；下载或识别失败时抛出异常。"""
+        # 每张图片的截止时间从开始下载时计算，下载 + 识别总共不超过 image_deadline
+        deadline = time.monotonic() + self.image_deadline
+        owned = None
+        try:
+            if self.cache is not None:
+                cached = self.cache.get_by_url(url, "tesseract", self.lang)
+                if cached is not None:
+                    TRACER.incr("cache_hits", cache="ocr")
+                    return cached, "cache_hits", 0.0
+                if self.preprocess is not None:
+                    reason = self.cache.get_skip(url, self.preprocess.skip_key)
+                    if reason is not None:
+                        TRACER.incr("cache_hits", cache="ocr")
+                        return "", f"skipped_{reason}", 0.0
+
+            with TRACER.span("ocr.download"):
+                img_bytes = download_image(url, timeout=self.download_timeout, session=self.session)
+            if self.cache is not None:
+                cached = self.cache.get_by_content(url, img_bytes, "tesseract", self.lang)
+                if cached is not None:
+                    TRACER.incr("cache_hits", cache="ocr")
+                    return cached, "cache_hits", 0.0
+
+            max_side = None
+            if self.preprocess is not None:
+                max_side = self.preprocess.max_side
+                info = analyze_image(img_bytes, self.preprocess)
+                if info.skip_reason is not None:
+                    # 跳过结果按 URL 和阈值缓存，阈值不变时下次不再下载；调整阈值后会重新判断
+                    TRACER.incr("ocr_skipped", reason=info.skip_reason)
+                    if self.cache is not None:
+                        self.cache.put_skip(url, self.preprocess.skip_key, info.skip_reason)
+                    return "", f"skipped_{info.skip_reason}", 0.0
+                if self.preprocess.dedupe:
+                    # 只有字节完全相同才复用结果，写入缓存的内容键也就一定对应这段文字
+                    duplicate, owned = self._claim_duplicate(content_key(img_bytes))
+                    if duplicate is not None:
+                        TRACER.incr("ocr_skipped", reason="duplicate")
+                        text = duplicate.result(timeout=max(deadline - time.monotonic(), 0))
+                        if self.cache is not None:
+                            self.cache.put(url, img_bytes, "tesseract", self.lang, text)
+                        return text, "deduped", 0.0
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("下载超出截止时间")
+            _, ocr_pool = self._pools()
+            future = ocr_pool.submit(_ocr_worker, img_bytes, self.lang, remaining, max_side, self.use_processes)
+            # ocr.wait 是提交到拿到结果的总时间（含进程池排队），ocr.image 只是 worker 内的识别时间
+            with TRACER.span("ocr.wait", engine="tesseract"):
+                text, cpu_seconds, ocr_seconds = future.result(timeout=remaining)
+            TRACER.observe("ocr.image", ocr_seconds, engine="tesseract")
+            if owned is not None:
+                owned.set_result(text)
+            if self.cache is not None:
+                self.cache.put(url, img_bytes, "tesseract", self.lang, text)
+            return text, "ocr", cpu_seconds
+        except Exception:
+            if owned is not None and not owned.done():
+                # 等待同一张图结果的重复图片直接得到空文本，不再各自重试
+                owned.set_result("")
+            raise
+
+    def ocr_urls(self, urls: List[str]) -> List[str]:
+        """对一组图片 URL 做 OCR，返回与输入顺序一致的文本列表。"""
+        download_pool, _ = self._pools()
+        futures = [download_pool.submit(self._process_one, url) for url in urls]
+        return [f.result() for f in futures]
+
+    def ocr_notes(self, image_lists: List[List[str]]) -> List[str]:
+        """
+        对多条笔记的图片一起做 OCR。
+        Args:
+            image_lists: 每条笔记的图片 URL 列表
+        Returns:
+            List[str]: 每条笔记拼接后的 OCR 文本，顺序与输入一致
+        """
+        flat = [(i, url) for i, urls in enumerate(image_lists) for url in urls]
+        texts = self.ocr_urls([url for _, url in flat])
+
+        per_note = [[] for _ in image_lists]
+        for (i, _), text in zip(flat, texts):
+            if text.strip():
+                per_note[i].append(text)
+        return ["\n".join(parts) for parts in per_note]
@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    """
+    OCR 前处理参数。
+    max_side: 送给 tesseract 的最长边像素，约等于手机截图按 ~150 DPI 缩放后的尺寸；
+              文字再大也不会提高识别率，tesseract 耗时却和像素数成正比
+    min_side / min_area: 小于该尺寸的图片（图标、表情、头像）直接跳过
+    min_text_score: 文字可能性低于该值的图片（风景、纯色背景）跳过，0 表示不检查
+    dedupe: 不同笔记引用内容完全相同（sha256 一致）的图片时只识别一次。
+            不用感知哈希：排版相近的文字截图哈希几乎一样，按哈希去重会把一张图的文字当成另一张的
+    """
+    max_side: int = 1600
+    min_side: int = 120
+    min_area: int = 120 * 240
+    min_text_score: float = 0.02
+    dedupe: bool = True
+
+    @property
+    def skip_key(self) -> str:
+        """决定是否跳过的参数组合，作为 OCRCache 中跳过结果的键；阈值改变后旧的跳过结果不再命中。"""
+        return f"side={self.min_side},area={self.min_area},text={self.min_text_score}"
+
+
+@dataclass
+class ImageInfo:
+    width: int
+    height: int
+    text_score: float
+    skip_reason: Optional[str] = None
+
+
+def _open(img_bytes: bytes):
+    from PIL import Image
+
+    return Image.open(BytesIO(img_bytes))
+
+
+def text_score(gray) -> float:
+    """
+    文字可能性的粗略估计：文字区域有大量高对比度的细边缘。
+    统计水平和垂直方向亮度突变（> 48）像素的比例，照片和纯色图通常远低于截图和海报。
+    """
+    arr = np.asarray(gray, dtype=np.int16)
+    if arr.shape[0] < 2 or arr.shape[1] < 2:
+        return 0.0
+    dx = np.abs(np.diff(arr, axis=1)) > 48
+    dy = np.abs(np.diff(arr, axis=0)) > 48
+    return float((dx.mean() + dy.mean()) / 2)
+
+
+def analyze_image(img_bytes: bytes, config: PreprocessConfig) -> ImageInfo:
+    """在下载线程里对图片做快速分析（尺寸、文字可能性），决定是否需要 OCR。"""
+    img = _open(img_bytes)
+    width, height = img.size  # 只读文件头，尚未解码
+    # JPEG 可以在解码时直接按 1/2~1/8 缩小，分析用的小图几乎不花解码时间
+    img.draft("L", (512, 512))
+    gray = img.convert("L")
+    # 按统一尺寸计算文字可能性，结果不受原图分辨率影响
+    gray.thumbnail((512, 512))
+    info = ImageInfo(width=width, height=height, text_score=text_score(gray))
+
+    if min(width, height) < config.min_side or width * height < config.min_area:
+        info.skip_reason = "too_small"
+    elif config.min_text_score and info.text_score < config.min_text_score:
+        info.skip_reason = "low_text"
+    return info
+
+
+def prepare_for_ocr(img_bytes: bytes, max_side: int = 1600):
+    """转灰度并把最长边缩到 max_side 以内，返回交给 tesseract 的 PIL 图片。"""
+    from PIL import Image
+
+    img = _open(img_bytes)
+    if max(img.size) > max_side:
+        # 大 JPEG 先用 draft 在解码阶段缩小，再精确缩放
+        img.draft("L", (max_side, max_side))
+    gray = img.convert("L")
+    if max(gray.size) > max_side:
+        scale = max_side / max(gray.size)
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.LANCZOS)
+    return gray
@@ -0,0 +1,162 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """小写、合并空白、去掉首尾标点，让只差大小写或问号的问题命中同一条缓存。"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" ?？!！.。,，")
+
+
+class LRUTTLCache:
+    """线程安全的 LRU 缓存，条目超过 ttl 秒后失效。"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class RewriteStats:
+    """查询改写的计数（跳过 / 命中缓存 / 调用 LLM），线程安全，可跨 pipeline 重建共享。"""
+
+    KEYS = ("rewritten", "cached", "skipped")
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.KEYS, 0)
+        self._lock = threading.Lock()
+
+    def incr(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+class SemanticAnswerCache:
+    """
+    语义答案缓存：用 embedding 余弦相似度匹配历史问题，换一种说法问同一件事也能命中。
+    每条缓存带有写入时的 collection 版本，入库或删除后版本变大，旧答案全部失效；
+    版本比当前旧的读写（读取版本后数据已被更新的慢请求）直接忽略。
+    """
+
+    def __init__(self, embed_fn, threshold: float = 0.92, maxsize: int = 256, ttl: float = 24 * 3600):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # normalized query -> (unit vector, value, expires_at)
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, query: str):
+        vec = np.asarray(self.embed_fn(normalize_query(query)), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _check_version(self, version) -> bool:
+        """调用方已持有锁。version 更新时清空缓存；返回 False 表示 version 已过期。"""
+        if self._version is None or version > self._version:
+            self._entries.clear()
+            self._version = version
+        return version == self._version
+
+    def lookup(self, query: str, version):
+        """返回 (value, similarity)；未命中时 value 为 None。"""
+        vec = self._embed(query)
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return None, 0.0
+            now = time.monotonic()
+            for key in [k for k, (_, _, exp) in self._entries.items() if exp < now]:
+                del self._entries[key]
+            if not self._entries:
+                self.misses += 1
+                return None, 0.0
+
+            keys = list(self._entries)
+            matrix = np.stack([self._entries[k][0] for k in keys])
+            sims = matrix @ vec
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None, float(sims[best])
+
+            self._entries.move_to_end(keys[best])
+            self.hits += 1
+            return self._entries[keys[best]][1], float(sims[best])
+
+    def store(self, query: str, value, version):
+        vec = self._embed(query)
+        with self._lock:
+            if not self._check_version(version):
+                return
+            key = normalize_query(query)
+            self._entries[key] = (vec, value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "version": self._version,
+        }
@@ -3,8 +3,13 @@ from langchain_google_vertexai import ChatVertexAI
 from embedding_database import MilvusStorage
 from retriever import MilvusMultiQueryRetriever
 from langchain.prompts import PromptTemplate
+from query_cache import LRUTTLCache, RewriteStats, SemanticAnswerCache
+from context_packer import ContextPacker
+from tracing import TRACER
 
+import asyncio
 import os
+import time
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "./my-gemini-key.json"
 
 class RAGPipeline:
@@ -38,24 +43,45 @@ Your Answer:
         temperature: float = 0.7,
         model_name: str = "gemini-1.5-pro",
         template: str = default_template_rq,
-        similarity_threshold: float = 0.5
+        similarity_threshold: float = 0.5,
+        storage: MilvusStorage = None,
+        rewrite_cache=None,
+        rewrite_stats=None,
+        llm=None,
+        answer_cache=None,
+        answer_cache_threshold: float = 0.92,
+        context_token_budget: int = 1500,
+        max_doc_tokens: int = 400,
+        mmr_lambda: float = 0.7
     ):
-        # 初始化向量库
-        self.storage = MilvusStorage(collection_name=collection_name, db_path=db_path)
+        # 初始化向量库（可传入共享的 storage，避免重复加载模型和连接）
+        self.storage = storage if storage is not None else MilvusStorage(collection_name=collection_name, db_path=db_path)
         self.similarity_threshold = similarity_threshold
 
-        # 初始化 LLM & prompt
-        self.llm = ChatVertexAI(model_name=model_name, temperature=temperature)
+        # 初始化 LLM & prompt（可传入替身 LLM 用于离线测试）
+        self.llm = llm if llm is not None else ChatVertexAI(model_name=model_name, temperature=temperature)
         self.QA_CHAIN_PROMPT = PromptTemplate(input_variables=["context","question"],
                                 template=template)
 
+        # 上下文装填：MMR 去重后按 token 预算截断；context_token_budget=None 时关闭
+        self.context_packer = None
+        if context_token_budget is not None:
+            self.context_packer = ContextPacker(
+                token_budget=context_token_budget,
+                max_doc_tokens=max_doc_tokens,
+                mmr_lambda=mmr_lambda
+            )
+
         # 构建 Retriever
         self.retriever = MilvusMultiQueryRetriever(
             storage=self.storage, 
             top_k=top_k, 
             query_rewrite=True, 
             llm=self.llm,
-            similarity_threshold=self.similarity_threshold
+            similarity_threshold=self.similarity_threshold,
+            rewrite_cache=rewrite_cache if rewrite_cache is not None else LRUTTLCache(),
+            rewrite_stats=rewrite_stats if rewrite_stats is not None else RewriteStats(),
+            context_packer=self.context_packer
         )
 
         # 构建 QA Chain
@@ -66,28 +92,186 @@ Your Answer:
             chain_type_kwargs={"prompt": self.QA_CHAIN_PROMPT}
         )
 
+        # 语义答案缓存：复用 storage 的 SentenceTransformer 匹配相似问题；answer_cache_threshold=None 时关闭
+        if answer_cache is None and answer_cache_threshold is not None:
+            answer_cache = SemanticAnswerCache(
+                embed_fn=lambda q: self.storage.embed_queries([q])[0],
+                threshold=answer_cache_threshold
+            )
+        self.answer_cache = answer_cache
+
+    def _lookup_answer(self, query: str, version):
+        cached, _ = self.answer_cache.lookup(query, version)
+        TRACER.incr("cache_hits" if cached is not None else "cache_misses", cache="answer")
+        return cached
+
     def answer(self, query: str) -> dict:
         """
         输入自然语言问题，返回答案及其来源文档。
         如果没有找到相关文档，让 LLM 提供通用回答。
         """
-        result = self.qa_chain.invoke(query)
-        
+        version = self.storage.collection_version
+        if self.answer_cache is not None:
+            cached = self._lookup_answer(query, version)
+            if cached is not None:
+                return {"answer": cached["answer"], "sources": list(cached["sources"])}
+
+        response = self._answer_uncached(query)
+        if self.answer_cache is not None:
+            self.answer_cache.store(query, response, version)
+        return response
+
+    async def aanswer(self, query: str, timings: dict = None) -> dict:
+        """
+        answer 的异步版本：基于 qa_chain.ainvoke，embedding 计算放到线程池执行。
+        传入 timings 字典时写入 retrieve / generate 两个阶段的耗时（秒）。
+        """
+        version = self.storage.collection_version
+        if self.answer_cache is not None:
+            cached = await asyncio.to_thread(self._lookup_answer, query, version)
+            if cached is not None:
+                return {"answer": cached["answer"], "sources": list(cached["sources"])}
+
+        # 与 qa_chain 相同的两步（检索 + stuff chain），分开计时
+        start = time.perf_counter()
+        with TRACER.span("retrieve"):
+            docs = await self.retriever.ainvoke(query)
+        retrieved = time.perf_counter()
+        with TRACER.span("llm.generate", docs=len(docs)):
+            result = await self.qa_chain.combine_documents_chain.ainvoke(
+                {"input_documents": docs, "question": query}
+            )
+        if timings is not None:
+            timings["retrieve"] = retrieved - start
+            timings["generate"] = time.perf_counter() - retrieved
+        response = {
+            "answer": result["output_text"],
+            "sources": self._format_sources(docs)
+        }
+        if self.answer_cache is not None:
+            await asyncio.to_thread(self.answer_cache.store, query, response, version)
+        return response
+
+    def _answer_uncached(self, query: str) -> dict:
+        # 与 qa_chain.invoke 相同的两步（检索 + stuff chain），分开计时以区分检索和生成的耗时
+        with TRACER.span("retrieve"):
+            docs = self.retriever.invoke(query)
+        with TRACER.span("llm.generate", docs=len(docs)):
+            result = self.qa_chain.combine_documents_chain.invoke(
+                {"input_documents": docs, "question": query}
+            )
+
         # 如果没有找到相关文档，让 LLM 提供通用回答
-        if not result["source_documents"]:
+        if not docs:
             return {
-                "answer": result["result"],
+                "answer": result["output_text"],
                 "sources": []
             }
-            
+
         return {
-            "answer": result["result"],
-            "sources": [
-                {
-                    "title": doc.metadata.get("title", ""),
-                    "content": doc.page_content,
-                    "url": doc.metadata.get("url", ""),
-                }
-                for doc in result["source_documents"]
-            ]
-        }
\ No newline at end of file
+            "answer": result["output_text"],
+            "sources": self._format_sources(docs)
+        }
+
+    @staticmethod
+    def _format_sources(docs) -> list:
+        return [
+            {
+                "title": doc.metadata.get("title", ""),
+                "content": doc.page_content,
+                "url": doc.metadata.get("url", ""),
+            }
+            for doc in docs
+        ]
+
+    def _build_prompt(self, query: str, docs) -> str:
+        # 与 stuff chain 的拼接方式一致：文档内容之间用空行分隔
+        context = "\n\n".join(doc.page_content for doc in docs)
+        return self.QA_CHAIN_PROMPT.format(context=context, question=query)
+
+    def stream_answer(self, query: str):
+        """
+        流式回答：检索完成后先产出来源文档，再逐个产出 LLM 生成的 token。
+        Yields:
+            {"type": "sources", "sources": [...], "retrieval_seconds": float}
+            {"type": "token", "text": str}
+            {"type": "done", "answer": str, "ttft_seconds": float, "total_seconds": float}
+        """
+        start = time.perf_counter()
+        version = self.storage.collection_version
+        if self.answer_cache is not None:
+            cached = self._lookup_answer(query, version)
+            if cached is not None:
+                yield {"type": "sources", "sources": list(cached["sources"]),
+                       "retrieval_seconds": time.perf_counter() - start}
+                yield {"type": "token", "text": cached["answer"]}
+                elapsed = time.perf_counter() - start
+                yield {"type": "done", "answer": cached["answer"], "ttft_seconds": elapsed,
+                       "total_seconds": elapsed, "cached": True}
+                return
+
+        with TRACER.span("retrieve"):
+            docs = self.retriever.invoke(query)
+        sources = self._format_sources(docs)
+        yield {"type": "sources", "sources": sources, "retrieval_seconds": time.perf_counter() - start}
+
+        ttft = None
+        parts = []
+        llm_start = time.perf_counter()
+        for chunk in self.llm.stream(self._build_prompt(query, docs)):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not text:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            parts.append(text)
+            yield {"type": "token", "text": text}
+
+        answer = "".join(parts)
+        total = time.perf_counter() - start
+        # 生成器的耗时包含调用方处理每个 token 的时间，这里只近似记录
+        TRACER.observe("llm.generate", time.perf_counter() - llm_start, docs=len(docs), streamed=True)
+        if self.answer_cache is not None:
+            self.answer_cache.store(query, {"answer": answer, "sources": sources}, version)
+        yield {"type": "done", "answer": answer, "ttft_seconds": ttft if ttft is not None else total,
+               "total_seconds": total, "cached": False}
+
+    async def astream_answer(self, query: str):
+        """stream_answer 的异步版本，产出的事件格式相同。"""
+        start = time.perf_counter()
+        version = self.storage.collection_version
+        if self.answer_cache is not None:
+            cached = await asyncio.to_thread(self._lookup_answer, query, version)
+            if cached is not None:
+                yield {"type": "sources", "sources": list(cached["sources"]),
+                       "retrieval_seconds": time.perf_counter() - start}
+                yield {"type": "token", "text": cached["answer"]}
+                elapsed = time.perf_counter() - start
+                yield {"type": "done", "answer": cached["answer"], "ttft_seconds": elapsed,
+                       "total_seconds": elapsed, "cached": True}
+                return
+
+        with TRACER.span("retrieve"):
+            docs = await self.retriever.ainvoke(query)
+        sources = self._format_sources(docs)
+        yield {"type": "sources", "sources": sources, "retrieval_seconds": time.perf_counter() - start}
+
+        ttft = None
+        parts = []
+        llm_start = time.perf_counter()
+        async for chunk in self.llm.astream(self._build_prompt(query, docs)):
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not text:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            parts.append(text)
+            yield {"type": "token", "text": text}
+
+        answer = "".join(parts)
+        total = time.perf_counter() - start
+        TRACER.observe("llm.generate", time.perf_counter() - llm_start, docs=len(docs), streamed=True)
+        if self.answer_cache is not None:
+            await asyncio.to_thread(self.answer_cache.store, query, {"answer": answer, "sources": sources}, version)
+        yield {"type": "done", "answer": answer, "ttft_seconds": ttft if ttft is not None else total,
+               "total_seconds": total, "cached": False}
@@ -0,0 +1,44 @@
+import asyncio
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限速器：平均每秒放行 rate 个请求，最多允许 burst 个突发。
+    同一个实例可以在多个线程或多个协程之间共享。
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """取走一个令牌，返回调用方还需要等待的秒数。"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """第 attempt 次重试前的等待时间：指数退避 + full jitter。"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,153 @@
+import threading
+import time
+
+from query_cache import LRUTTLCache, RewriteStats
+from startup_profile import STARTUP
+
+
+class ResourceRegistry:
+    """
+    进程级共享资源：embedding 模型、Milvus 客户端、MilvusStorage 和 RAGPipeline 只加载一次。
+    Gradio 的并发请求共享同一个 pipeline；重新入库后调用 rebuild_pipeline 原子地替换，
+    正在处理的请求继续使用旧实例直至完成。
+    """
+
+    def __init__(self, collection_name="xiaohongshu_content", db_path="./milvus_demo.db",
+                 storage_kwargs=None, embedding_kwargs=None, setup=None, **pipeline_kwargs):
+        self.collection_name = collection_name
+        self.db_path = db_path
+        self.storage_kwargs = storage_kwargs or {}
+        # 传给 embedding_backends.load_embedding_model：backend / num_threads / max_seq_length
+        self.embedding_kwargs = embedding_kwargs or {}
+        # 首次构建 pipeline 前执行一次的初始化（如 vertexai.init），放在后台预热线程里完成
+        self._setup = setup
+        self._setup_done = False
+        self.ready = threading.Event()
+        self.pipeline_kwargs = pipeline_kwargs
+
+        self._lock = threading.RLock()
+        self._model = None
+        self._client = None
+        self._storage = None
+        self._pipeline = None
+        # 查询改写缓存在 pipeline 重建后继续保留
+        self.rewrite_cache = LRUTTLCache(maxsize=1024, ttl=24 * 3600)
+        self.rewrite_stats = RewriteStats()
+        self._answer_cache = None
+
+    def embedding_model(self):
+        with self._lock:
+            if self._model is None:
+                from embedding_backends import load_embedding_model
+                from embedding_database import EMBEDDING_MODEL_NAME
+
+                with STARTUP.phase("embedding model"):
+                    self._model = load_embedding_model(EMBEDDING_MODEL_NAME, **self.embedding_kwargs)
+            return self._model
+
+    def milvus_client(self):
+        with self._lock:
+            if self._client is None:
+                with STARTUP.phase("milvus client"):
+                    from pymilvus import MilvusClient
+
+                    self._client = MilvusClient(self.db_path)
+            return self._client
+
+    def storage(self):
+        with self._lock:
+            if self._storage is None:
+                from embedding_database import MilvusStorage
+
+                self._storage = MilvusStorage(
+                    collection_name=self.collection_name,
+                    db_path=self.db_path,
+                    client=self.milvus_client(),
+                    model=self.embedding_model(),
+                    **self.storage_kwargs,
+                )
+            return self._storage
+
+    def answer_cache(self):
+        """答案缓存同样跨 pipeline 重建共享；入库后靠 collection 版本号自动失效。"""
+        with self._lock:
+            threshold = self.pipeline_kwargs.get("answer_cache_threshold", 0.92)
+            if self._answer_cache is None and threshold is not None:
+                from query_cache import SemanticAnswerCache
+
+                storage = self.storage()
+                self._answer_cache = SemanticAnswerCache(
+                    embed_fn=lambda q: storage.embed_queries([q])[0],
+                    threshold=threshold,
+                )
+            return self._answer_cache
+
+    def _run_setup(self):
+        with self._lock:
+            if self._setup is not None and not self._setup_done:
+                with STARTUP.phase("setup"):
+                    self._setup()
+                self._setup_done = True
+
+    def _build_pipeline(self):
+        self._run_setup()
+        with STARTUP.phase("import rag_pipeline"):
+            from rag_pipeline import RAGPipeline
+
+        return RAGPipeline(
+            collection_name=self.collection_name,
+            db_path=self.db_path,
+            storage=self.storage(),
+            rewrite_cache=self.rewrite_cache,
+            rewrite_stats=self.rewrite_stats,
+            answer_cache=self.answer_cache(),
+            **self.pipeline_kwargs,
+        )
+
+    def pipeline(self):
+        with self._lock:
+            if self._pipeline is None:
+                self._pipeline = self._build_pipeline()
+            return self._pipeline
+
+    def rebuild_pipeline(self):
+        """重新入库后重建 pipeline（模型和客户端仍然复用）。"""
+        new_pipeline = self._build_pipeline()
+        with self._lock:
+            self._pipeline = new_pipeline
+        return new_pipeline
+
+    def warm(self):
+        """启动时预热：加载模型、建立连接，并跑一次 encode 让推理路径完成初始化。"""
+        start = time.perf_counter()
+        model = self.embedding_model()
+        with STARTUP.phase("warm-up encode"):
+            model.encode(["warm up"], show_progress_bar=False)
+        with STARTUP.phase("storage + pipeline"):
+            self.pipeline()
+        self.ready.set()
+        print(f"🔥 资源预热完成，用时 {time.perf_counter() - start:.2f}s")
+
+    def warm_in_background(self):
+        """
+        在后台线程预热，界面可以先启动接受连接；预热完成前到达的请求会在锁上等待，
+        不会重复加载模型。预热失败时请求仍会按需重新加载。
+        """
+        def run():
+            try:
+                self.warm()
+            except Exception as e:
+                print(f"❌ 后台预热失败: {e}")
+            print(STARTUP.report())
+
+        thread = threading.Thread(target=run, name="registry-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        with self._lock:
+            if self._storage is not None:
+                self._storage.close()
+            if self._client is not None:
+                self._client.close()
+            self._model = self._client = self._storage = self._pipeline = None
@@ -1,9 +1,19 @@
-from typing import List, Any
+import asyncio
+import functools
+import re
+from typing import List, Any, Optional
 from langchain_core.retrievers import BaseRetriever
 from langchain.schema import Document
 from langchain.prompts import PromptTemplate
 from pydantic import Field
 
+from query_cache import LRUTTLCache, RewriteStats, normalize_query
+from tracing import TRACER
+
+REWRITE_TEMPLATE = "Please generate {n} different rephrasings of the following user question, optimized for information retrieval: \n\nUser Question: {query}\n\nRewritten Queries:"
+
+_CJK_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
 
 class MilvusMultiQueryRetriever(BaseRetriever):
     """支持多 query 改写的 Retriever，兼容 from_chain_type。"""
@@ -12,40 +22,151 @@ class MilvusMultiQueryRetriever(BaseRetriever):
     top_k: int = Field(default=5)
     n_queries: int = Field(default=3)
     query_rewrite: bool = Field(default=True)
-    similarity_threshold: float = Field(default=0.5)
+    similarity_threshold: Optional[float] = Field(default=0.5)
+    rrf_k: int = Field(default=60)
+    # 改写缓存（LRU + TTL），以规范化后的问题 + 改写 prompt + 模型为键
+    rewrite_cache: Any = Field(default_factory=LRUTTLCache)
+    # 短关键词查询（如 "python"、"杭州"）跳过改写，直接走向量检索；按字符数而不是词数判断，
+    # "chinese food" 这类两个词的短语仍然改写
+    skip_rewrite_max_chars: int = Field(default=8)
+    skip_rewrite_max_cjk_chars: int = Field(default=4)
+    # 计数器加锁，由 ResourceRegistry 传入时跨 pipeline 重建保留
+    rewrite_stats: Any = Field(default_factory=RewriteStats)
+    # 上下文装填（MMR 去重 + token 预算）；设置后每个查询多取 fetch_k 条候选交给它挑选
+    context_packer: Any = Field(default=None)
+    fetch_k: int = Field(default=None)
 
-    def _generate_queries(self, query: str) -> List[str]:
-        rewrite_prompt = PromptTemplate.from_template(
-            "Please generate {n} different rephrasings of the following user question, optimized for information retrieval: \n\nUser Question: {query}\n\nRewritten Queries:"
-        )
-        query_rewriter = rewrite_prompt | self.llm
-        output = query_rewriter.invoke({"query": query, "n": self.n_queries}).content
+    def _search_kwargs(self) -> dict:
+        if self.context_packer is None:
+            return {"top_k": self.top_k, "similarity_threshold": self.similarity_threshold}
+        return {"top_k": self.fetch_k or self.top_k * 2,
+                "similarity_threshold": self.similarity_threshold,
+                "include_vectors": True}
+
+    def _is_keyword_query(self, query: str) -> bool:
+        query = normalize_query(query)
+        cjk_chars = len(_CJK_RE.findall(query))
+        words = _CJK_RE.sub(" ", query).split()
+        if cjk_chars and words:
+            return False
+        if cjk_chars:
+            return cjk_chars <= self.skip_rewrite_max_cjk_chars
+        return len(query) <= self.skip_rewrite_max_chars
+
+    def rewrite_metrics(self) -> dict:
+        """改写被跳过 / 命中缓存 / 真正调用 LLM 的次数和比例。"""
+        stats = self.rewrite_stats.snapshot()
+        total = sum(stats.values())
+        stats["skip_rate"] = stats["skipped"] / total if total else 0.0
+        stats["cache_rate"] = stats["cached"] / total if total else 0.0
+        if self.rewrite_cache is not None:
+            stats["cache"] = self.rewrite_cache.stats()
+        return stats
+
+    def _rewrite_cache_key(self, query: str):
+        model = getattr(self.llm, "model_name", None) or type(self.llm).__name__
+        return (normalize_query(query), REWRITE_TEMPLATE, model, self.n_queries)
+
+    def _rewrite_from_cache(self, query: str):
+        """跳过或命中缓存时直接返回改写结果，否则返回 None 表示需要调用 LLM。"""
+        if self._is_keyword_query(query):
+            self.rewrite_stats.incr("skipped")
+            TRACER.incr("rewrite_skipped")
+            return []
+        cached = self.rewrite_cache.get(self._rewrite_cache_key(query)) if self.rewrite_cache is not None else None
+        if cached is not None:
+            self.rewrite_stats.incr("cached")
+            TRACER.incr("cache_hits", cache="rewrite")
+            return list(cached)
+        TRACER.incr("cache_misses", cache="rewrite")
+        return None
+
+    def _parse_rewrites(self, query: str, output: str) -> List[str]:
         queries = [q.strip("-• \n") for q in output.strip().split("\n") if q.strip()]
         print(f"Generated queries: {queries}")
-        return queries[:self.n_queries]
-    
-    def _get_relevant_documents_for_one_query(self, query: str) -> List[Document]:
-        results = self.storage.search(query, top_k=self.top_k, similarity_threshold=self.similarity_threshold)
-        docs = []
-        for match in results[0]:
-            metadata = {"title": match["entity"]["title"], 
-                       "url": match["entity"]["url"]}
-            content = match["entity"]["content"]
-            docs.append(Document(page_content=content, metadata=metadata))
-        return docs
+        queries = queries[:self.n_queries]
+        self.rewrite_stats.incr("rewritten")
+        if self.rewrite_cache is not None:
+            self.rewrite_cache.set(self._rewrite_cache_key(query), tuple(queries))
+        return queries
 
+    def _generate_queries(self, query: str) -> List[str]:
+        queries = self._rewrite_from_cache(query)
+        if queries is not None:
+            return queries
+
+        rewrite_prompt = PromptTemplate.from_template(REWRITE_TEMPLATE)
+        query_rewriter = rewrite_prompt | self.llm
+        with TRACER.span("rewrite.llm"):
+            output = query_rewriter.invoke({"query": query, "n": self.n_queries}).content
+        return self._parse_rewrites(query, output)
+
+    async def _agenerate_queries(self, query: str) -> List[str]:
+        queries = self._rewrite_from_cache(query)
+        if queries is not None:
+            return queries
+
+        rewrite_prompt = PromptTemplate.from_template(REWRITE_TEMPLATE)
+        query_rewriter = rewrite_prompt | self.llm
+        with TRACER.span("rewrite.llm"):
+            output = (await query_rewriter.ainvoke({"query": query, "n": self.n_queries})).content
+        return self._parse_rewrites(query, output)
+    
     def _get_relevant_documents(self, query: str) -> List[Document]:
-        sub_queries = self._generate_queries(query)
+        sub_queries = self._generate_queries(query) if self.query_rewrite else []
 
-        all_docs = []
-        for q in sub_queries:
-            all_docs.extend(self._get_relevant_documents_for_one_query(q))
+        # 原始问题 + 改写后的问题，一次 encode、一次多向量 search
+        queries = list(dict.fromkeys([query] + sub_queries))
+        results = self.storage.search_batch(queries, **self._search_kwargs())
+        return self._fuse_results(results)
 
-        # 去重（按 page_content）
-        unique_docs = {}
-        for doc in all_docs:
-            key = doc.page_content.strip()
-            if key not in unique_docs:
-                unique_docs[key] = doc
+    async def _aget_relevant_documents(self, query: str) -> List[Document]:
+        """
+        异步检索：原始问题的检索和 LLM 改写同时进行，改写返回后再批量检索子问题。
+        encode 和 Milvus 调用是阻塞的，放到线程池里执行，不占用事件循环。
+        """
+        search = functools.partial(self.storage.search_batch, **self._search_kwargs())
+        original_task = asyncio.create_task(asyncio.to_thread(search, [query]))
+        try:
+            sub_queries = await self._agenerate_queries(query) if self.query_rewrite else []
+        except BaseException:
+            # 改写失败时也要回收原始检索任务，避免任务悬挂、异常无人读取
+            original_task.cancel()
+            await asyncio.gather(original_task, return_exceptions=True)
+            raise
 
-        return list(unique_docs.values())
+        sub_queries = [q for q in dict.fromkeys(sub_queries) if q != query]
+        results = list(await original_task)
+        if sub_queries:
+            results.extend(await asyncio.to_thread(search, sub_queries))
+        return self._fuse_results(results)
+
+    def _fuse_results(self, results) -> List[Document]:
+        """按笔记 id 合并多个查询的结果，用 reciprocal-rank fusion 打分排序。"""
+        scores = {}
+        matches = {}
+        for hits in results:
+            for rank, match in enumerate(hits):
+                note_id = match["id"]
+                scores[note_id] = scores.get(note_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                matches.setdefault(note_id, match)
+
+        if not scores:
+            TRACER.incr("empty_retrievals")
+
+        docs = []
+        vectors = {}
+        for note_id in sorted(scores, key=scores.get, reverse=True):
+            entity = matches[note_id]["entity"]
+            metadata = {"id": note_id,
+                        "title": entity["title"],
+                        "url": entity["url"],
+                        "score": scores[note_id]}
+            docs.append(Document(page_content=entity["content"], metadata=metadata))
+            if "vector" in entity:
+                vectors[note_id] = entity["vector"]
+
+        if self.context_packer is not None:
+            docs, stats = self.context_packer.pack(docs, vectors)
+            TRACER.incr("context_tokens", stats["tokens"])
+        return docs
@@ -0,0 +1,99 @@
+# startup_profile.py
+# 启动耗时分析：进程内按阶段计时，以及类似 -X importtime 但按子系统汇总的导入耗时
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 顶层包 -> 子系统
+SUBSYSTEMS = {
+    "torch / sentence-transformers": ["torch", "sentence_transformers", "transformers", "tokenizers",
+                                      "safetensors", "huggingface_hub", "scipy", "sklearn"],
+    "milvus": ["pymilvus", "milvus_lite", "grpc", "google.protobuf"],
+    "vertex ai / langchain": ["vertexai", "google", "langchain", "langchain_core", "langchain_google_vertexai",
+                              "langchain_community", "pydantic"],
+    "gradio": ["gradio", "gradio_client", "fastapi", "starlette", "uvicorn", "httpx", "matplotlib"],
+    "playwright": ["playwright", "greenlet"],
+    "ocr": ["pytesseract", "PIL", "unstructured", "unstructured_inference", "cv2", "onnxruntime", "pdfminer"],
+    "pandas / numpy": ["pandas", "numpy", "openpyxl"],
+}
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+class StartupProfiler:
+    """记录启动各阶段（导入、模型加载、建立连接……）的耗时，可在多个线程中使用。"""
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases = []  # (name, thread name, start offset, seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, threading.current_thread().name,
+                                    start - self._t0, time.perf_counter() - start))
+
+    def mark(self, name: str):
+        """记录一个时间点（如 "ui ready"），耗时记为 0。"""
+        with self._lock:
+            self.phases.append((name, threading.current_thread().name, time.perf_counter() - self._t0, 0.0))
+
+    def report(self) -> str:
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p[2])
+        lines = ["⏱️ 启动耗时："]
+        for name, thread, offset, seconds in phases:
+            lines.append(f"  +{offset:7.2f}s  {name:<28} {seconds:7.2f}s  [{thread}]")
+        return "\n".join(lines)
+
+
+# 进程级共享的 profiler，frontend 和 ResourceRegistry 都往这里记录
+STARTUP = StartupProfiler()
+
+
+def _subsystem(module: str) -> str:
+    for name, packages in SUBSYSTEMS.items():
+        for package in packages:
+            if module == package or module.startswith(package + "."):
+                return name
+    return "other"
+
+
+def import_time_report(modules, python=sys.executable) -> dict:
+    """
+    在干净的子进程里用 -X importtime 导入 modules，把每个模块自身的导入耗时按子系统汇总。
+    Returns:
+        dict: {子系统: 秒}，按耗时降序
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([python, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    totals = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, _, _, module = match.groups()
+        key = _subsystem(module)
+        totals[key] = totals.get(key, 0.0) + int(self_us) / 1e6
+    if proc.returncode != 0:
+        print(f"⚠️ 导入失败：{proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+    return dict(sorted(totals.items(), key=lambda kv: kv[1], reverse=True))
+
+
+if __name__ == "__main__":
+    # 对比只回答问题时需要的模块和入库时才需要的模块
+    for label, modules in [
+        ("query path", ["gradio", "resources", "rag_pipeline", "embedding_database"]),
+        ("ingest path", ["crawl_xiaohongshu_board", "streaming_pipeline", "pytesseract", "unstructured.partition.image"]),
+    ]:
+        print(f"== {label}: {', '.join(modules)}")
+        for subsystem, seconds in import_time_report(modules).items():
+            print(f"  {subsystem:<32} {seconds:6.2f}s")
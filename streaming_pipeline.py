@@ -0,0 +1,193 @@
+import queue
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from embedding_database import note_id_from_url
+from ocr_pipeline import parse_image_list
+
+_STOP = object()
+
+
+class StreamingIngestPipeline:
+    """
+    抓取 → OCR → 向量化 → 写入 的流式流水线。
+    各阶段之间是有界队列，下游慢时上游自动阻塞（背压），
+    每个小批次写入后立刻可被检索，不必等整个收藏夹抓完。
+    sinks 中的对象（如 board_store.BoardWriter）会收到每条抓到的笔记，流水线结束时 close。
+    """
+
+    def __init__(
+        self,
+        storage,
+        queue_size: int = 32,
+        ocr_threads: int = 4,
+        batch_size: int = 16,
+        max_batch_wait: float = 2.0,
+        encode_batch_size: int = 32,
+        skip_unchanged: bool = True,
+        delete_missing: bool = False,
+        sinks: Optional[List] = None,
+    ):
+        self.storage = storage
+        self.queue_size = queue_size
+        self.ocr_threads = ocr_threads
+        self.batch_size = batch_size
+        self.max_batch_wait = max_batch_wait
+        self.encode_batch_size = encode_batch_size
+        self.skip_unchanged = skip_unchanged
+        self.delete_missing = delete_missing
+        self.sinks = sinks or []
+
+        self._errors = []
+        self._seen_ids = []
+        self._board_ids = None
+        self._lock = threading.Lock()
+        self.stats = {"crawled": 0, "skipped": 0, "indexed": 0}
+
+    def set_board_links(self, links: Iterable[str]):
+        """
+        记录收藏夹当前的全部链接（作为 iter_xiaohongshu_board 的 on_links 回调）。
+        delete_missing 以这份链接为准：详情页抓取失败的笔记仍在收藏夹里，不能删除。
+        """
+        ids = {note_id_from_url(url) for url in links}
+        with self._lock:
+            self._board_ids = ids
+
+    def _fail(self, stage: str, e: Exception):
+        print(f"❌ 流水线阶段 {stage} 出错: {e}")
+        with self._lock:
+            self._errors.append((stage, e))
+
+    def _produce(self, notes: Iterable[dict], out_q: queue.Queue):
+        try:
+            for note in notes:
+                note = dict(note)
+                note["images"] = parse_image_list(note.get("images"))
+                for sink in self.sinks:
+                    sink.write(note)
+                with self._lock:
+                    self.stats["crawled"] += 1
+                out_q.put(note)
+        except Exception as e:
+            self._fail("crawl", e)
+        finally:
+            for _ in range(self.ocr_threads):
+                out_q.put(_STOP)
+
+    def _is_unchanged(self, note: dict) -> bool:
+        note_id = note_id_from_url(note["url"])
+        with self._lock:
+            self._seen_ids.append(note_id)
+        if not self.skip_unchanged:
+            return False
+        new_hash = self.storage.note_hash(note["title"], note["content"], note["images"])
+        return self.storage.existing_hashes([note_id]).get(note_id) == new_hash
+
+    def _ocr_stage(self, ocr, in_q: queue.Queue, out_q: queue.Queue):
+        try:
+            while True:
+                note = in_q.get()
+                if note is _STOP:
+                    break
+                try:
+                    if self._is_unchanged(note):
+                        with self._lock:
+                            self.stats["skipped"] += 1
+                        continue
+                    texts = ocr.ocr_urls(note["images"])
+                    note["ocr_text"] = "\n".join(t for t in texts if t.strip())
+                    out_q.put(note)
+                except Exception as e:
+                    self._fail("ocr", e)
+        finally:
+            out_q.put(_STOP)
+
+    def _embed_stage(self, in_q: queue.Queue, out_q: queue.Queue):
+        # 凑满 batch_size 或等待超过 max_batch_wait 就向量化一批，兼顾吞吐和时延
+        remaining_producers = self.ocr_threads
+        batch = []
+        deadline = None
+        try:
+            while remaining_producers:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    note = in_q.get(timeout=timeout)
+                except queue.Empty:
+                    note = None
+                if note is _STOP:
+                    remaining_producers -= 1
+                elif note is not None:
+                    if not batch:
+                        deadline = time.monotonic() + self.max_batch_wait
+                    batch.append(note)
+
+                if batch and (len(batch) >= self.batch_size or note is None or not remaining_producers):
+                    try:
+                        out_q.put(self.storage.build_rows_from_notes(batch, self.encode_batch_size))
+                    except Exception as e:
+                        self._fail("embed", e)
+                    batch = []
+                    deadline = None
+        finally:
+            out_q.put(_STOP)
+
+    def _insert_stage(self, in_q: queue.Queue):
+        while True:
+            rows = in_q.get()
+            if rows is _STOP:
+                break
+            try:
+                # upsert 保证重复抓到同一条笔记时不会产生重复数据
+                self.storage.upsert_rows(rows)
+                with self._lock:
+                    self.stats["indexed"] += len({row["note_id"] for row in rows})
+                print(f"📥 已写入 {self.stats['indexed']} 条笔记（已抓取 {self.stats['crawled']} 条）")
+            except Exception as e:
+                self._fail("insert", e)
+
+    def run(self, notes: Iterable[dict]) -> dict:
+        """
+        消费笔记迭代器（如 iter_xiaohongshu_board 的输出），直到全部写入。
+        Returns:
+            dict: crawled / skipped / indexed / deleted 数量以及耗时
+        """
+        start = time.perf_counter()
+        crawl_q = queue.Queue(maxsize=self.queue_size)
+        embed_q = queue.Queue(maxsize=self.queue_size)
+        insert_q = queue.Queue(maxsize=max(self.queue_size // self.batch_size, 2))
+
+        try:
+            with self.storage.new_ocr() as ocr:
+                threads = [threading.Thread(target=self._produce, args=(notes, crawl_q), name="ingest-crawl")]
+                threads += [
+                    threading.Thread(target=self._ocr_stage, args=(ocr, crawl_q, embed_q), name=f"ingest-ocr-{i}")
+                    for i in range(self.ocr_threads)
+                ]
+                threads.append(threading.Thread(target=self._embed_stage, args=(embed_q, insert_q), name="ingest-embed"))
+                threads.append(threading.Thread(target=self._insert_stage, args=(insert_q,), name="ingest-insert"))
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            self.storage.flush()
+        finally:
+            # 建 OCR 池或 flush 出错时也要关闭 sink，收藏夹文件句柄不泄漏、已写的内容落盘
+            for sink in self.sinks:
+                sink.close()
+
+        summary = dict(self.stats)
+        summary["deleted"] = 0
+        if self.delete_missing:
+            # 只按完整的链接列表删除：抓取中途失败、没有收到链接列表或链接为空（加载超时）时都不删，
+            # 否则会把没抓到的笔记误删
+            if self._errors:
+                print("⚠️ 流水线出错，跳过删除已移除的笔记")
+            elif not self._board_ids:
+                print("⚠️ 没有收到收藏夹链接列表，跳过删除已移除的笔记")
+            else:
+                summary["deleted"] = self.storage.delete_missing_notes(self._board_ids | set(self._seen_ids))
+        summary["errors"] = len(self._errors)
+        summary["seconds"] = time.perf_counter() - start
+        print(f"✅ 流式入库完成: {summary}")
+        return summary
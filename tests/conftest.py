@@ -0,0 +1,44 @@
+# 测试直接导入仓库根目录下的模块（与脚本的运行方式一致）
+import hashlib
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class HashingEmbedder:
+    """
+    SentenceTransformer 的离线替身：英文单词和单个汉字哈希到 384 维的词袋向量并归一化，
+    共享词越多余弦相似度越高。只实现 MilvusStorage 用到的 encode，测试不需要下载模型。
+    """
+    dim = 384
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True, **kwargs):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in re.findall(r"[a-z0-9]+|[一-鿿]", str(text).lower()):
+                digest = hashlib.md5(token.encode("utf-8")).digest()
+                vectors[i, int.from_bytes(digest[:4], "little") % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """临时 milvus-lite 数据库上的 MilvusStorage，不写 OCR 缓存。"""
+    pytest.importorskip("pandas")
+    pytest.importorskip("pymilvus")
+    pytest.importorskip("milvus_lite")
+    from embedding_database import MilvusStorage
+
+    storage = MilvusStorage(collection_name="test_content", db_path=str(tmp_path / "test.db"),
+                            model=HashingEmbedder(), ocr_cache_path=None)
+    try:
+        yield storage
+    finally:
+        storage.close()
@@ -0,0 +1,99 @@
+# batch_evaluate 的离线运行：回答和评测都用 FakeChatVertexAI，LLM 缓存写在临时目录
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_google_vertexai")
+pytest.importorskip("pymilvus")
+
+from langchain_core.globals import set_llm_cache
+
+from batch_evaluate import load_questions, run_batch, summarize, with_retry
+from bench_fixtures import FakeChatVertexAI, generate_board
+from evaluate_response import ResponseEvaluator
+from llm_cache import PromptHashCache
+
+METRICS = {"Relevance", "Accuracy", "Completeness", "Fluency", "Usefulness"}
+QUERIES = ["hangzhou 西湖", "python asyncio", "蛋炒饭 recipe", "上海咖啡店", "深蹲 fitness"]
+
+
+@pytest.fixture
+def harness(storage, tmp_path):
+    from rag_pipeline import RAGPipeline
+
+    storage.sync_data(generate_board(30))
+    llm = FakeChatVertexAI(latency=0.01, token_latency=0)
+    pipeline = RAGPipeline(storage=storage, llm=llm, similarity_threshold=0.1, answer_cache_threshold=None)
+    evaluator = ResponseEvaluator(llm=llm)
+
+    path = tmp_path / "questions.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for query in QUERIES:
+            f.write(json.dumps({"query": query, "tag": "smoke"}, ensure_ascii=False) + "\n")
+    return pipeline, evaluator, load_questions(str(path))
+
+
+def test_run_batch_scores_every_question(harness):
+    pipeline, evaluator, questions = harness
+    records = asyncio.run(run_batch(questions, pipeline, evaluator, concurrency=3, retries=0))
+
+    assert [r["id"] for r in records] == list(range(len(QUERIES)))
+    for record in records:
+        assert "error" not in record
+        assert record["tag"] == "smoke"
+        assert set(record["scores"]) == METRICS
+        assert all(3 <= score <= 5 for score in record["scores"].values())
+        assert set(record["timings"]) == {"retrieve", "generate", "judge", "total"}
+
+    summary = summarize(records)
+    assert summary["queries"] == len(QUERIES)
+    assert summary["failed"] == 0
+    assert summary["unparsed"] == 0
+    assert set(summary["scores"]) == METRICS
+    assert set(summary["latency"]) == {"retrieve", "generate", "judge", "total"}
+
+
+def test_rerun_is_served_from_prompt_cache(harness, tmp_path):
+    pipeline, evaluator, questions = harness
+    cache = PromptHashCache(str(tmp_path / "llm_cache.db"))
+    set_llm_cache(cache)
+    try:
+        first = asyncio.run(run_batch(questions, pipeline, evaluator, concurrency=3, retries=0))
+        misses, hits = cache.misses, cache.hits
+        assert misses > 0
+
+        second = asyncio.run(run_batch(questions, pipeline, evaluator, concurrency=3, retries=0))
+        # 第二次没有新的 prompt：每个问题的生成和评测都命中磁盘缓存（改写由内存里的改写缓存命中）
+        assert cache.misses == misses
+        assert cache.hits - hits >= 2 * len(QUERIES)
+        assert [r["scores"] for r in second] == [r["scores"] for r in first]
+    finally:
+        set_llm_cache(None)
+        cache.close()
+
+
+def test_with_retry_retries_until_success():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("temporary")
+        return "ok"
+
+    assert asyncio.run(with_retry(flaky, retries=3, base=0.001)) == "ok"
+    assert len(calls) == 3
+
+
+def test_extract_scores_ignores_colons_in_feedback():
+    evaluator = ResponseEvaluator(llm=FakeChatVertexAI(latency=0))
+    text = (
+        "1. Relevance: 4/5\n"
+        "Feedback: covers the question: mostly\n"
+        "**Accuracy:** [4.5]/5\n"
+        "3. Completeness: 3 / 5\n"
+    )
+    assert evaluator._extract_scores(text) == {"Relevance": 4.0, "Accuracy": 4.5, "Completeness": 3.0}
@@ -0,0 +1,76 @@
+# 并发爬虫对着 make_board_site 生成的静态页面运行，需要 playwright 和已安装的 chromium
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("tqdm")
+pytest.importorskip("langchain_core")
+pytest.importorskip("playwright")
+
+from bench_fixtures import LocalImageServer, make_board_site, make_fixture_images
+from crawl_xiaohongshu_board import acrawl_xiaohongshu_board, iter_xiaohongshu_board_concurrent
+
+N_NOTES = 12
+
+
+@pytest.fixture(scope="module")
+def chromium():
+    from playwright.sync_api import sync_playwright
+
+    try:
+        with sync_playwright() as p:
+            p.chromium.launch(headless=True).close()
+    except Exception as e:
+        pytest.skip(f"chromium is not available: {e}")
+
+
+@pytest.fixture
+def board_site(tmp_path, chromium):
+    directory = str(tmp_path / "site")
+    image_names = make_fixture_images(directory, n_images=3)
+    with LocalImageServer(directory) as server:
+        notes = make_board_site(directory, N_NOTES, image_base_url=server.base_url, image_names=image_names)
+        yield server.base_url, notes
+
+
+def _crawl_kwargs(base_url, tmp_path):
+    return dict(base_url=base_url, require_login=False, headless=True,
+                user_data_dir=str(tmp_path / "profile"), rate=50, burst=10)
+
+
+def test_concurrent_crawl_reads_every_note(board_site, tmp_path):
+    base_url, expected = board_site
+    links = []
+    notes = asyncio.run(acrawl_xiaohongshu_board(
+        f"{base_url}/board.html", concurrency=3, on_links=links.extend, **_crawl_kwargs(base_url, tmp_path)
+    ))
+
+    expected_by_url = {base_url + note["path"]: note for note in expected}
+    assert sorted(links) == sorted(expected_by_url)
+    assert sorted(note["url"] for note in notes) == sorted(expected_by_url)
+    for note in notes:
+        want = expected_by_url[note["url"]]
+        assert note["title"] == want["title"]
+        assert note["content"] == want["content"]
+        assert note["images"] == want["images"]
+
+
+def test_iter_concurrent_stops_when_consumer_leaves(board_site, tmp_path):
+    base_url, _ = board_site
+    notes = iter_xiaohongshu_board_concurrent(
+        f"{base_url}/board.html", queue_size=1, concurrency=2, **_crawl_kwargs(base_url, tmp_path)
+    )
+    first = [next(notes), next(notes)]
+    notes.close()
+    assert all(note["title"] for note in first)
+
+    # 后台抓取线程在下一次写队列时发现消费方已离开并退出
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if not any(t.name == "xhs-async-crawl" for t in threading.enumerate()):
+            break
+        time.sleep(0.2)
+    assert not any(t.name == "xhs-async-crawl" for t in threading.enumerate())
@@ -0,0 +1,134 @@
+# ParallelOCR 对着 LocalImageServer 提供的 fixture 图片运行；
+# 除最后一个用例外都把 tesseract 换成按图片内容返回固定文本的函数，不需要安装 tesseract
+import hashlib
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("numpy")
+pytest.importorskip("requests")
+pytest.importorskip("pandas")
+pytest.importorskip("langchain_core")
+
+import ocr_pipeline
+from bench_fixtures import LocalImageServer, make_ocr_fixture_set, ocr_fixture_keyword
+from ocr_cache import OCRCache
+from ocr_pipeline import ParallelOCR
+
+
+def _fake_tesseract(img_bytes, lang="chi_sim+eng", timeout=0, max_side=None):
+    return "text " + hashlib.sha256(img_bytes).hexdigest()[:12]
+
+
+def _expected_text(directory, name):
+    with open(os.path.join(directory, name), "rb") as f:
+        return _fake_tesseract(f.read())
+
+
+@pytest.fixture
+def fixture_set(tmp_path):
+    directory = str(tmp_path / "images")
+    fixtures = make_ocr_fixture_set(directory)
+    with LocalImageServer(directory) as server:
+        yield directory, fixtures, server.base_url
+
+
+@pytest.fixture
+def fake_tesseract(monkeypatch):
+    # 线程池模式下 worker 在本进程里调用模块级的 ocr_image_bytes
+    monkeypatch.setattr(ocr_pipeline, "ocr_image_bytes", _fake_tesseract)
+
+
+def _urls(base_url, names):
+    return [f"{base_url}/{name}" for name in names]
+
+
+def test_ocr_notes_keeps_note_order(fixture_set, fake_tesseract):
+    directory, fixtures, base_url = fixture_set
+    image_lists = [
+        _urls(base_url, fixtures["text"][:2]),
+        [],
+        _urls(base_url, [fixtures["text"][2], fixtures["icon"][0]]),
+    ]
+    with ParallelOCR(use_processes=False, download_workers=4, ocr_workers=2) as ocr:
+        texts = ocr.ocr_notes(image_lists)
+
+    assert texts == [
+        "\n".join(_expected_text(directory, name) for name in fixtures["text"][:2]),
+        "",
+        _expected_text(directory, fixtures["text"][2]),
+    ]
+
+
+def test_distinct_text_images_are_not_deduped(fixture_set, fake_tesseract, tmp_path):
+    # 排版相同、文字不同的截图必须各自识别；只有逐字节相同的副本才复用结果
+    directory, fixtures, base_url = fixture_set
+    names = fixtures["text"] + fixtures["duplicate"]
+    cache = OCRCache(str(tmp_path / "ocr_cache.db"))
+    try:
+        with ParallelOCR(use_processes=False, cache=cache) as ocr:
+            texts = ocr.ocr_urls(_urls(base_url, names))
+            stats = dict(ocr.stats)
+
+        for name, text in zip(names, texts):
+            assert text == _expected_text(directory, name)
+        assert len(set(texts)) == len(fixtures["text"])
+        assert stats["ocr"] == len(fixtures["text"])
+        assert stats["deduped"] == len(fixtures["duplicate"])
+
+        # 缓存里每张图的内容键都对应它自己的文字
+        for name in fixtures["text"]:
+            with open(os.path.join(directory, name), "rb") as f:
+                img_bytes = f.read()
+            assert cache.get_by_content(f"{base_url}/{name}", img_bytes, "tesseract", ocr.lang) \
+                == _expected_text(directory, name)
+    finally:
+        cache.close()
+
+
+def test_skip_results_are_cached_by_url(fixture_set, fake_tesseract, tmp_path):
+    directory, fixtures, base_url = fixture_set
+    names = fixtures["icon"] + fixtures["photo"]
+    cache = OCRCache(str(tmp_path / "ocr_cache.db"))
+    try:
+        with ParallelOCR(use_processes=False, cache=cache) as ocr:
+            assert ocr.ocr_urls(_urls(base_url, names)) == [""] * len(names)
+            first = dict(ocr.stats)
+        assert first["skipped_too_small"] == len(fixtures["icon"])
+        assert first["skipped_low_text"] == len(fixtures["photo"])
+        assert first["ocr"] == 0
+
+        # 第二次不再下载：图片已经不在服务器上，仍然按缓存的原因跳过
+        for name in names:
+            os.remove(os.path.join(directory, name))
+        with ParallelOCR(use_processes=False, cache=cache) as ocr:
+            assert ocr.ocr_urls(_urls(base_url, names)) == [""] * len(names)
+            second = dict(ocr.stats)
+        assert second["failed"] == 0
+        assert second["skipped_too_small"] == len(fixtures["icon"])
+        assert second["skipped_low_text"] == len(fixtures["photo"])
+    finally:
+        cache.close()
+
+
+def test_failed_download_returns_empty_text(fixture_set, fake_tesseract):
+    directory, fixtures, base_url = fixture_set
+    urls = _urls(base_url, [fixtures["text"][0], "missing.jpg"])
+    with ParallelOCR(use_processes=False) as ocr:
+        texts = ocr.ocr_urls(urls)
+        assert ocr.stats["failed"] == 1
+    assert texts == [_expected_text(directory, fixtures["text"][0]), ""]
+
+
+@pytest.mark.skipif(shutil.which("tesseract") is None, reason="tesseract is not installed")
+def test_tesseract_reads_each_fixture(fixture_set):
+    pytest.importorskip("pytesseract")
+    directory, fixtures, base_url = fixture_set
+    names = fixtures["text"] + fixtures["duplicate"]
+    with ParallelOCR(lang="eng", ocr_workers=2) as ocr:
+        texts = ocr.ocr_urls(_urls(base_url, names))
+
+    for name, text in zip(names, texts):
+        assert ocr_fixture_keyword(name) in text.lower()
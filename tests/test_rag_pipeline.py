@@ -0,0 +1,100 @@
+# RAGPipeline 接 FakeChatVertexAI，在临时 milvus-lite 库上测试入库同步、删除和答案缓存
+import json
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_google_vertexai")
+pytest.importorskip("pymilvus")
+
+from bench_fixtures import FakeChatVertexAI, generate_board
+from board_store import BoardWriter
+from streaming_pipeline import StreamingIngestPipeline
+
+
+def _pipeline(storage, **kwargs):
+    from rag_pipeline import RAGPipeline
+
+    kwargs.setdefault("answer_cache_threshold", None)
+    return RAGPipeline(storage=storage, llm=FakeChatVertexAI(latency=0, token_latency=0),
+                       similarity_threshold=0.1, top_k=3, **kwargs)
+
+
+def _stored_urls(storage):
+    rows = storage.query("id >= 0")
+    return {row["url"] for row in rows}
+
+
+def test_sync_and_delete_round_trip(storage):
+    board = generate_board(10)
+    assert storage.sync_data(board)["inserted"] == 10
+    version = storage.collection_version
+    assert version > 0
+
+    # 内容没变：全部跳过，版本不变
+    summary = storage.sync_data(board)
+    assert summary["skipped"] == 10 and summary["inserted"] == summary["updated"] == 0
+    assert storage.collection_version == version
+
+    # 改一条、删三条
+    remaining = board.iloc[:7].copy()
+    remaining.loc[remaining.index[0], "content"] = "hangzhou 更新后的内容"
+    summary = storage.sync_data(remaining, delete_missing=True)
+    assert summary["updated"] == 1
+    assert summary["skipped"] == 6
+    assert summary["deleted"] == 3
+    assert storage.collection_version > version
+    assert _stored_urls(storage) == set(remaining["url"])
+
+
+def test_answer_through_stub_llm(storage):
+    board = generate_board(30)
+    storage.sync_data(board)
+    pipeline = _pipeline(storage)
+
+    response = pipeline.answer("hangzhou 西湖 攻略")
+    assert response["answer"].startswith("token0 ")
+    assert response["sources"]
+    assert {src["url"] for src in response["sources"]} <= set(board["url"])
+
+
+def test_answer_cache_is_invalidated_by_sync(storage):
+    board = generate_board(20)
+    storage.sync_data(board)
+    pipeline = _pipeline(storage, answer_cache_threshold=0.92)
+
+    first = pipeline.answer("python asyncio tips")
+    assert pipeline.answer("python asyncio tips") == first
+    assert pipeline.answer_cache.stats()["hits"] == 1
+
+    # 删除笔记后 collection 版本变大，旧答案不再返回
+    storage.sync_data(board.iloc[:10], delete_missing=True)
+    pipeline.answer("python asyncio tips")
+    stats = pipeline.answer_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["version"] == storage.collection_version
+
+
+def test_streaming_ingest_writes_board_file_and_deletes_missing(storage, tmp_path):
+    board = generate_board(12)
+    storage.sync_data(board)
+
+    kept = board.iloc[:8].to_dict("records")
+    path = str(tmp_path / "board.jsonl")
+    ingest = StreamingIngestPipeline(storage, delete_missing=True, sinks=[BoardWriter(path)])
+
+    def notes():
+        # 与 iter_xiaohongshu_board 相同：先回调完整的链接列表，再逐条产出笔记
+        ingest.set_board_links([note["url"] for note in kept])
+        yield from kept
+
+    summary = ingest.run(notes())
+    assert summary["crawled"] == 8
+    assert summary["skipped"] == 8
+    assert summary["deleted"] == 4
+    assert _stored_urls(storage) == {note["url"] for note in kept}
+
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["url"] for row in rows] == [note["url"] for note in kept]
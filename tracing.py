@@ -0,0 +1,164 @@
+# tracing.py
+# 轻量的分阶段计时和计数：span 记录耗时直方图，counter 记录缓存命中、OCR 失败等事件，
+# 以结构化日志（JSON）输出，并可通过 Prometheus 文本格式的 /metrics 端点暴露。
+# 关闭时（默认，TRACING=1 开启）span / incr 只做一次布尔判断，几乎没有额外开销。
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("bookmark_assistant.trace")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NOOP = nullcontext()
+
+
+def _label_str(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False, log_spans: bool = True, buckets=DEFAULT_BUCKETS, prefix="bookmark"):
+        self.enabled = enabled
+        self.log_spans = log_spans
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}  # span name -> [bucket counts..., +Inf count, sum]
+        self._counters = {}    # (name, labels) -> value
+        self._server = None
+
+    # ---------- spans ----------
+    def span(self, name: str, **attrs):
+        """计时上下文：`with TRACER.span("milvus.search", queries=3): ...`"""
+        if not self.enabled:
+            return _NOOP
+        return self._span(name, attrs)
+
+    @contextmanager
+    def _span(self, name, attrs):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, error=error, **attrs)
+
+    def observe(self, name: str, seconds: float, error=None, **attrs):
+        """记录一次耗时（span 之外计时的场景也可以直接调用）。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[len(self.buckets)] += 1
+            hist[-1] += seconds
+        if error is not None:
+            self.incr("span_errors", span=name, error=error)
+        if self.log_spans:
+            record = {"span": name, "ms": round(seconds * 1000, 3), **attrs}
+            if error is not None:
+                record["error"] = error
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def traced(self, name: str):
+        """函数装饰器形式的 span。"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ---------- counters ----------
+    def incr(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self) -> dict:
+        """当前所有指标的字典形式（用于测试和基准脚本）。"""
+        with self._lock:
+            spans = {
+                name: {"count": hist[len(self.buckets)], "sum_seconds": hist[-1]}
+                for name, hist in self._histograms.items()
+            }
+            counters = {f"{name}{_label_str(labels)}": value for (name, labels), value in self._counters.items()}
+        return {"spans": spans, "counters": counters}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # ---------- Prometheus ----------
+    def render_prometheus(self) -> str:
+        lines = []
+        metric = f"{self.prefix}_span_seconds"
+        with self._lock:
+            if self._histograms:
+                lines.append(f"# TYPE {metric} histogram")
+            for name, hist in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, hist):
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{span="{name}",le="+Inf"}} {hist[len(self.buckets)]}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {hist[-1]}')
+                lines.append(f'{metric}_count{{span="{name}"}} {hist[len(self.buckets)]}')
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                counter = f"{self.prefix}_{name}_total"
+                if counter not in typed:
+                    lines.append(f"# TYPE {counter} counter")
+                    typed.add(counter)
+                lines.append(f"{counter}{_label_str(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port: int = 9464, host: str = "127.0.0.1"):
+        """
+        在后台线程启动只提供 /metrics 的 HTTP 服务，与 Gradio 应用并行运行。
+        默认只监听本机，与 Gradio 一致；需要被其他机器抓取时显式传入 host。
+        """
+        if self._server is not None:
+            return self._server
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"📈 Prometheus 指标: http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+
+# 进程级共享的 tracer；环境变量 TRACING=1 时开启
+TRACER = Tracer(enabled=os.environ.get("TRACING", "0") == "1")